@@ -6,12 +6,17 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 UPLOAD_DIR = BASE_DIR / "uploads"
 OUTPUT_DIR = BASE_DIR / "outputs"
+# BOM 페이지 렌더 캐시 - (PDF 해시, 페이지, DPI) 별 PNG. OUTPUT_DIR 세션의 bom_page*.png 는
+# 여기로의 하드링크이며, 캐시 합계가 RENDER_CACHE_MAX_MB 를 넘으면 오래 안 쓴 것부터 삭제
+RENDER_CACHE_DIR = BASE_DIR / "cache" / "renders"
+RENDER_CACHE_MAX_MB = int(os.getenv("RENDER_CACHE_MAX_MB", "1024"))
 DB_DIR = BASE_DIR / "data"
 TEMPLATE_DIR = BASE_DIR.parent.parent  # SBAI root for templates
 
 UPLOAD_DIR.mkdir(exist_ok=True)
 OUTPUT_DIR.mkdir(exist_ok=True)
 DB_DIR.mkdir(exist_ok=True)
+RENDER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
 # Database
 SQLITE_DB_PATH = DB_DIR / "sbai.db"
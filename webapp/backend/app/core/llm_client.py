@@ -4,6 +4,20 @@ from app.core.config import OPENAI_API_KEY, ANTHROPIC_API_KEY, GOOGLE_API_KEY
 
 logger = logging.getLogger(__name__)
 
+# VLM 서비스 공용 동기 Anthropic 클라이언트 (httpx 커넥션 풀 재사용)
+ANTHROPIC_MAX_RETRIES = 3
+_anthropic_client = None
+
+
+def get_anthropic_client():
+    """프로세스 전역 Anthropic 클라이언트 (최초 호출 시 생성, 429/5xx 는 SDK 재시도)"""
+    global _anthropic_client
+    if _anthropic_client is None:
+        import anthropic
+        _anthropic_client = anthropic.Anthropic(
+            api_key=ANTHROPIC_API_KEY, max_retries=ANTHROPIC_MAX_RETRIES)
+    return _anthropic_client
+
 
 async def llm_chat(system_prompt: str, user_message: str, max_tokens: int = 2048) -> str:
     """LLM 호출: OpenAI(gpt-4o) > Claude(claude-sonnet-4-5) > Gemini(gemini-2.0-flash) 순서로 시도"""
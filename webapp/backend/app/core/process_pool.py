@@ -0,0 +1,35 @@
+"""서비스 공용 프로세스 풀 (PDF 페이지 렌더링)"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Linux 기본 start method 인 fork 는 부모(uvicorn)의 상태를 그대로 복제함
+# (Anthropic 클라이언트 싱글톤의 httpx keep-alive 소켓 등) → spawn 으로 깨끗한 워커 사용
+_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+# 페이지 렌더링 풀 상한 - 워커마다 전체 페이지 pixmap(수십 MB)을 들고 있으므로 웹 서버 안에서 제한
+RENDER_MAX_WORKERS = 4
+# 이보다 적은 페이지는 인라인 렌더링 - spawn 워커 기동(인터프리터 + fitz import, 워커당 ~0.15s)이
+# A3 200DPI 페이지 1장 렌더링(~0.3s)과 비슷해 소량 작업에서는 풀 이득이 없음
+RENDER_POOL_MIN_PAGES = 4
+
+
+def new_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """spawn 컨텍스트 프로세스 풀 생성 (워커는 부모 상태를 상속하지 않음)"""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=_MP_CONTEXT)
+
+
+def available_cpus() -> int:
+    """현재 프로세스가 쓸 수 있는 CPU 수 (affinity 반영, 컨테이너 CPU quota 는 반영 안 됨)"""
+    if hasattr(os, "process_cpu_count"):  # Python 3.13+
+        return os.process_cpu_count() or 1
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def render_worker_count(task_count: int) -> int:
+    """렌더링 작업 수 → 워커 수 (RENDER_MAX_WORKERS, 가용 CPU 로 제한, 소량 작업은 1 = 인라인)"""
+    if task_count < RENDER_POOL_MIN_PAGES:
+        return 1
+    return max(1, min(task_count, available_cpus(), RENDER_MAX_WORKERS))
@@ -2,6 +2,7 @@
 import uuid
 import asyncio
 import logging
+import fitz  # PyMuPDF
 from pathlib import Path
 from fastapi import APIRouter, UploadFile, File, BackgroundTasks, HTTPException
 from app.core.config import UPLOAD_DIR, OUTPUT_DIR, TEMPLATE_DIR
@@ -44,15 +45,17 @@ async def _process_file(session_id: str, file_path: str, file_type: str, filenam
             await db_service.save_dimensions(session_id, result["dimensions"])
 
         elif file_type == "pid":
-            # 1. 기존 밸브 추출
-            valves = pid_service.extract_valves(file_path)
-            await db_service.save_valves(session_id, valves)
+            # 1. 기존 밸브 추출 (PDF 는 1회만 열어 렌더링까지 공유, 렌더링은 저장 후 마지막)
+            with fitz.open(file_path) as pdf_doc:
+                valves = pid_service.extract_valves(pdf_doc)
+                await db_service.save_valves(session_id, valves)
 
-            excel_path = str(session_dir / "valve_list.xlsx")
-            template = TEMPLATE_DIR / "2. 260210-VALVE-LIST-양식-외부송부용.xlsx"
-            template_str = str(template) if template.exists() else None
-            excel_service.generate_valve_excel(valves, excel_path, template_str)
-            pid_service.render_pid_pages(file_path, str(session_dir))
+                excel_path = str(session_dir / "valve_list.xlsx")
+                template = TEMPLATE_DIR / "2. 260210-VALVE-LIST-양식-외부송부용.xlsx"
+                template_str = str(template) if template.exists() else None
+                excel_service.generate_valve_excel(valves, excel_path, template_str)
+                # 렌더링(프로세스 풀 대기 포함)은 스레드에서 → 이벤트 루프 블로킹 방지
+                await asyncio.to_thread(pid_service.render_pid_pages, pdf_doc, str(session_dir))
 
             import json
             with open(session_dir / "valve_data.json", "w") as f:
@@ -113,8 +116,8 @@ async def _process_file(session_id: str, file_path: str, file_type: str, filenam
             excel_path = str(session_dir / "pipe_bom.xlsx")
             excel_service.generate_pipe_bom_excel(pages_data, excel_path)
 
-            # BOM 페이지 이미지 렌더링
-            pipe_bom_service.render_bom_pages(file_path, str(session_dir))
+            # BOM 페이지 이미지 렌더링 (프로세스 풀 대기 포함, 스레드에서 → 이벤트 루프 블로킹 방지)
+            await asyncio.to_thread(pipe_bom_service.render_bom_pages, file_path, str(session_dir))
 
             with open(session_dir / "pipe_bom_data.json", "w") as f:
                 json.dump(pages_data, f, ensure_ascii=False, indent=2)
@@ -158,16 +161,19 @@ async def _process_file(session_id: str, file_path: str, file_type: str, filenam
 
         elif file_type == "pdf":
             import json
-            # 일반 PDF - 양쪽 모두 시도
-            valves = pid_service.extract_valves(file_path)
-            pages_data = pipe_bom_service.extract_pipe_bom(file_path)
+            # 일반 PDF - 양쪽 모두 시도 (밸브가 있으면 같은 문서로 페이지 렌더링)
+            with fitz.open(file_path) as pdf_doc:
+                valves = pid_service.extract_valves(pdf_doc)
+                pages_data = pipe_bom_service.extract_pipe_bom(file_path)
+
+                if valves:
+                    await db_service.save_valves(session_id, valves)
+                    excel_path = str(session_dir / "valve_list.xlsx")
+                    excel_service.generate_valve_excel(valves, excel_path)
+                    # 렌더링(프로세스 풀 대기 포함)은 스레드에서 → 이벤트 루프 블로킹 방지
+                    await asyncio.to_thread(pid_service.render_pid_pages, pdf_doc, str(session_dir))
 
             if valves:
-                await db_service.save_valves(session_id, valves)
-                excel_path = str(session_dir / "valve_list.xlsx")
-                excel_service.generate_valve_excel(valves, excel_path)
-                pid_service.render_pid_pages(file_path, str(session_dir))
-
                 # 심볼 추출 시도
                 try:
                     symbols = symbol_db_service.extract_symbols_from_legend(
@@ -1,26 +1,58 @@
 """Excel 생성 서비스 - 밸브 리스트 + PIPE BOM"""
 import json
+import datetime
 import openpyxl
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+from openpyxl import LXML
+from openpyxl.styles import Font, Alignment, Border, Side, PatternFill, NamedStyle
+from openpyxl.cell import Cell, WriteOnlyCell
 from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.dimensions import ColumnDimension
+from openpyxl.writer.excel import ExcelWriter
 from copy import copy
 from pathlib import Path
-from collections import defaultdict, OrderedDict
+from zipfile import ZipFile, ZIP_DEFLATED
+from collections import Counter, namedtuple, OrderedDict
 import logging
 
 logger = logging.getLogger(__name__)
 
+# openpyxl 은 lxml 설치 시 시트 XML 을 lxml.etree.xmlfile 로 스트리밍 (미설치/OPENPYXL_LXML=False 시 순수 파이썬 폴백)
+if not LXML:
+    logger.warning("openpyxl is not using lxml; Excel sheets will be serialized with the slower "
+                   "et_xmlfile fallback (install lxml and leave OPENPYXL_LXML unset)")
+
 # Styles
 HEADER_FONT = Font(name="Arial", size=10, bold=True, color="FFFFFF")
 HEADER_FILL = PatternFill(start_color="2F5496", end_color="2F5496", fill_type="solid")
 SUBHEADER_FILL = PatternFill(start_color="D6E4F0", end_color="D6E4F0", fill_type="solid")
 DATA_FONT = Font(name="Arial", size=9)
+STAT_TITLE_FONT = Font(name="Arial", size=11, bold=True)
+STAT_FONT = Font(name="Arial", size=10)
+TOTAL_FONT = Font(name="Arial", size=10, bold=True)  # 섹션 라벨 / TOTAL 행
+TOTAL_FILL = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
+BOTH_SOURCE_FILL = PatternFill(start_color="DBEAFE", end_color="DBEAFE", fill_type="solid")
 BORDER = Border(
     left=Side(style="thin"), right=Side(style="thin"),
     top=Side(style="thin"), bottom=Side(style="thin")
 )
 CENTER = Alignment(horizontal="center", vertical="center", wrap_text=True)
 
+# NamedStyle (워크북당 1회 등록 → 셀에는 스타일 이름만 지정, styles.xml 에 1개 항목)
+STAT_HEADER_STYLE = "stat_header"
+BOM_HEADER_STYLE = "bom_header"
+BOM_DATA_STYLE = "bom_data"
+BOM_TOTAL_STYLE = "bom_total"
+NAMED_STYLE_SPECS = {
+    STAT_HEADER_STYLE: {"font": STAT_TITLE_FONT},
+    BOM_HEADER_STYLE: {"font": HEADER_FONT, "fill": HEADER_FILL, "alignment": CENTER, "border": BORDER},
+    BOM_DATA_STYLE: {"font": DATA_FONT, "alignment": CENTER, "border": BORDER},
+    BOM_TOTAL_STYLE: {"font": TOTAL_FONT, "fill": TOTAL_FILL, "alignment": CENTER, "border": BORDER},
+}
+
+SAVE_BUFFER_SIZE = 1 << 20  # 1 MiB
+SAVE_COMPRESS_LEVEL = 1  # deflate 최저 레벨 - 압축 시간 우선 (파일 크기 약간 증가)
+COL_LETTERS = tuple(get_column_letter(i) for i in range(1, 64))  # 열 번호 → 문자 (A..BK)
+
 # Piping class → material mapping
 PIPING_CLASS_MAP = {
     "CS3": {"piping_spec": "ACS10B3", "body": "ASTM A536", "trim": "B62",
@@ -34,6 +66,10 @@ SSW_SPEC = {
     "flange": "150 Lbs RF WN\n(A105)", "pipe_mat": "ASTM A53 Gr.B _ POLYETHYLENE LINING INSIDE"
 }
 
+# PIPE BOM 페이지 정규화 레코드 (pages_data 1회 순회로 추출)
+PageRec = namedtuple("PageRec", "page pipe_pieces bases weld_items dims other_dims weld_count "
+                                "has_loose dims_str pieces_str rev_str")
+
 DESIGN_CONDITIONS = {
     "SW": {"press": 6.5, "temp": 60},
     "SSW": {"press": 10, "temp": 60},
@@ -44,54 +80,215 @@ DESIGN_CONDITIONS = {
 
 def _style_header(ws, row, max_col):
     for col in range(1, max_col + 1):
-        cell = ws.cell(row=row, column=col)
-        cell.font = HEADER_FONT
-        cell.fill = HEADER_FILL
-        cell.alignment = CENTER
-        cell.border = BORDER
+        ws.cell(row=row, column=col).style = BOM_HEADER_STYLE
+
+
+def _header_cells(ws, headers):
+    """write-only 시트용 헤더 행 (_style_header 와 같은 서식)"""
+    cells = []
+    for h in headers:
+        cell = WriteOnlyCell(ws, value=h)
+        cell.style = BOM_HEADER_STYLE
+        cells.append(cell)
+    return cells
+
+
+def _data_cells(ws, values, max_col, style=BOM_DATA_STYLE):
+    """write-only 시트용 데이터 행 - max_col 까지 NamedStyle 적용 (TOTAL 행은 bom_total)"""
+    cells = []
+    for col in range(max_col):
+        cell = WriteOnlyCell(ws, value=values[col] if col < len(values) else None)
+        cell.style = style
+        cells.append(cell)
+    return cells
+
+
+def _data_cells_fill(ws, values, max_col, fill):
+    """_data_cells + 행 전체 fill"""
+    cells = _data_cells(ws, values, max_col)
+    for cell in cells:
+        cell.fill = fill
+    return cells
+
+
+def _set_widths(ws, widths):
+    """열 너비 설정 - write-only 시트는 첫 append 전에 호출해야 반영됨"""
+    for letter, w in zip(COL_LETTERS, widths):
+        ws.column_dimensions[letter].width = w
+
+
+def _piece_slot(piece_summary, base):
+    """base 파이프 피스 집계 dict 반환 (없으면 생성) - 해시 조회 1회"""
+    info = piece_summary.get(base)
+    if info is None:
+        info = piece_summary[base] = {
+            "sub_pieces": [], "shop_welds": 0, "field_welds": 0,
+            "total_welds": 0, "pages": set(), "dims": [], "has_loose": False,
+        }
+    return info
+
+
+def _save_workbook(wb, output_path):
+    """큰 버퍼의 파일 핸들 + 빠른 deflate 레벨로 저장 (wb.save 와 동일한 내용)"""
+    if wb.write_only and not wb.worksheets:
+        wb.create_sheet()
+    wb.properties.modified = datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None)
+    with open(output_path, "wb", buffering=SAVE_BUFFER_SIZE) as fh:
+        archive = ZipFile(fh, "w", ZIP_DEFLATED, allowZip64=True,
+                          compresslevel=SAVE_COMPRESS_LEVEL)
+        ExcelWriter(wb, archive).save()
+
+
+def _ensure_named_styles(wb):
+    """NAMED_STYLE_SPECS 를 워크북에 등록 (워크북마다 별도 NamedStyle 인스턴스 - 스타일 id 가 워크북별로 바인딩됨)"""
+    registered = wb.named_styles
+    for name, spec in NAMED_STYLE_SPECS.items():
+        if name not in registered:
+            wb.add_named_style(NamedStyle(name=name, **spec))
+
+
+def _write_stats(ws, stats):
+    """(label, value, is_section) 통계 표를 행 단위로 append (A/B 열 너비 포함, write-only 시트 호환)
+
+    섹션 제목 행 (is_section) 만 NamedStyle 적용
+    """
+    _ensure_named_styles(ws.parent)
+    cd = ws.column_dimensions
+    cd["A"] = ColumnDimension(ws, index="A", width=35)
+    cd["B"] = ColumnDimension(ws, index="B", width=50)
+
+    append = ws.append
+    body_font = STAT_FONT
+    for label, value, is_section in stats:
+        c1 = WriteOnlyCell(ws, value=label)
+        c2 = WriteOnlyCell(ws, value=value)
+        if is_section:
+            c1.style = STAT_HEADER_STYLE
+        else:
+            c1.font = body_font
+            c2.font = body_font
+        append((c1, c2))
 
 
-def _style_data(ws, row, max_col, font=None, fill=None):
-    for col in range(1, max_col + 1):
-        cell = ws.cell(row=row, column=col)
-        cell.font = font or DATA_FONT
-        cell.alignment = CENTER
-        cell.border = BORDER
-        if fill:
-            cell.fill = fill
+def _classify(valve):
+    """밸브 1개에 대한 (piping spec, 재질 정보, 설계 조건) 을 한 번에 결정"""
+    tag = valve.get("tag", "")
+    fluid = valve.get("fluid", "")
+    is_ssw = tag.startswith("SSW")
+    if fluid == "SW" and is_ssw:
+        mat_info = SSW_SPEC
+    else:
+        mat_info = PIPING_CLASS_MAP.get(valve.get("piping_class", "CS3"), PIPING_CLASS_MAP["CS3"])
+    if is_ssw:
+        design = DESIGN_CONDITIONS.get("SSW", {"press": 10, "temp": 60})
+    else:
+        design = DESIGN_CONDITIONS.get(fluid, {"press": 6.5, "temp": 60})
+    return mat_info["piping_spec"], mat_info, design
 
 
 def _get_piping_spec(valve):
-    fluid = valve.get("fluid", "")
-    piping_class = valve.get("piping_class", "CS3")
-    if fluid == "SW" and valve["tag"].startswith("SSW"):
-        return SSW_SPEC["piping_spec"]
-    return PIPING_CLASS_MAP.get(piping_class, PIPING_CLASS_MAP["CS3"])["piping_spec"]
+    return _classify(valve)[0]
 
 
 def _get_material_info(valve):
-    piping_class = valve.get("piping_class", "CS3")
-    fluid = valve.get("fluid", "")
-    if fluid == "SW" and valve["tag"].startswith("SSW"):
-        return SSW_SPEC
-    return PIPING_CLASS_MAP.get(piping_class, PIPING_CLASS_MAP["CS3"])
+    return _classify(valve)[1]
 
 
 def _get_design_conditions(valve):
-    tag = valve.get("tag", "")
-    fluid = valve.get("fluid", "")
-    if tag.startswith("SSW"):
-        return DESIGN_CONDITIONS.get("SSW", {"press": 10, "temp": 60})
-    return DESIGN_CONDITIONS.get(fluid, {"press": 6.5, "temp": 60})
+    return _classify(valve)[2]
+
+
+def _valve_row(no, valve, valve_type, sheet_labels):
+    """밸브 리스트 1행 (26열) 값 - Manual/Control 섹션 공용
+
+    sheet_labels: sheet 값 → "Sheet N" 문자열 캐시 (같은 도면 시트의 밸브끼리 공유)
+    """
+    piping_spec, mat_info, design = _classify(valve)
+    sch = valve.get("schedule", "STD")
+    size = valve.get("size", "")
+    sheet = valve.get("sheet", "")
+    sheet_label = sheet_labels.get(sheet)
+    if sheet_label is None:
+        sheet_label = sheet_labels[sheet] = f"Sheet {sheet}"
+    return [
+        no,
+        valve["tag"],
+        piping_spec,
+        valve.get("location", ""),
+        valve.get("description", ""),
+        valve.get("fluid", ""),
+        design["press"],
+        design["temp"],
+        valve_type,
+        valve.get("valve_subtype", ""),
+        mat_info["body"],
+        mat_info["trim"],
+        int(size) if size.isdigit() else size,
+        "ANSI",
+        mat_info["flange"],
+        "FLG",
+        "FLG",
+        mat_info["pipe_mat"],
+        sch,
+        sch,
+        "-",
+        3,
+        "-",
+        "-",
+        "-",
+        sheet_label,
+    ]
+
+
+def _set_cell(ws, row, column, value):
+    """ws.cell 과 동일하게 기록하되 좌표 검증 없이 ws._cells 에 직접 접근 (템플릿 모드용)
+
+    openpyxl 내부 구조가 달라 _cells 가 없으면 ws.cell 로 fallback
+    """
+    try:
+        cell = ws._cells.get((row, column))
+    except AttributeError:
+        return ws.cell(row=row, column=column, value=value)
+    if cell is None:
+        cell = Cell(ws, row=row, column=column)
+        ws._add_cell(cell)
+    if value is not None:
+        cell.value = value
+    return cell
+
+
+def _write_valve_section(ws, first_row, section_valves, from_template, ref_style_cols,
+                         sheet_labels, valve_type=None):
+    """밸브 섹션 기록 - valve_type 미지정 시 각 밸브의 valve_type 사용
+
+    ref_style_cols (템플릿 참조 스타일) 는 템플릿 모드에서만 존재
+    """
+    for i, valve in enumerate(section_valves):
+        row = first_row + i
+        row_vals = _valve_row(i + 1, valve,
+                              valve_type if valve_type is not None else valve.get("valve_type", ""),
+                              sheet_labels)
+        if not from_template:
+            ws.append(row_vals)
+            continue
+
+        # 템플릿 행은 이미 셀이 존재하므로 위치 지정 기록 - 기록한 셀을 그대로 스타일 적용에 재사용
+        cells = [_set_cell(ws, row, col, value) for col, value in enumerate(row_vals, 1)]
+        for col, font, alignment, border in ref_style_cols:
+            cell = cells[col - 1]
+            cell.font = font
+            cell.alignment = alignment
+            cell.border = border
 
 
 def generate_valve_excel(valves: list[dict], output_path: str, template_path: str = None) -> str:
     """밸브 리스트 Excel 생성"""
-    if template_path and Path(template_path).exists():
+    from_template = bool(template_path and Path(template_path).exists())
+    if from_template:
         wb = openpyxl.load_workbook(template_path)
         ws = wb.active if "Manual" not in wb.sheetnames else wb["Manual"]
 
-        # 참조 스타일 저장
+        # 참조 스타일 저장 (열당 1회만 복사 - 행 루프에서는 같은 객체를 공유)
         ref_styles = {}
         if ws.max_row >= 8:
             for cell in ws[8]:
@@ -108,6 +305,7 @@ def generate_valve_excel(valves: list[dict], output_path: str, template_path: st
                 ws.cell(row=row_num, column=col).value = None
     else:
         wb = openpyxl.Workbook()
+        _ensure_named_styles(wb)
         ws = wb.active
         ws.title = "Valve List"
         ref_styles = {}
@@ -122,6 +320,10 @@ def generate_valve_excel(valves: list[dict], output_path: str, template_path: st
             ws.cell(row=1, column=col, value=h)
         _style_header(ws, 1, len(headers))
 
+    # 1~26 열 중 참조 스타일이 있는 열만 (col, font, alignment, border) 로 미리 펼침
+    ref_style_cols = [(col, st["font"], st["alignment"], st["border"])
+                      for col, st in sorted(ref_styles.items()) if col <= 26]
+
     # 밸브 분류
     manual_valves = sorted(
         [v for v in valves if v.get("valve_type") != "CONTROL"],
@@ -136,225 +338,144 @@ def generate_valve_excel(valves: list[dict], output_path: str, template_path: st
     start_row = 7 if template_path else 2
     if template_path:
         ws.cell(row=start_row, column=1, value="1. Manual Valve")
+    if not from_template:
+        # 첫 append 가 start_row + 1 행에 오도록 빈 행 채움
+        for _ in range(ws.max_row, start_row):
+            ws.append([])
 
-    for i, valve in enumerate(manual_valves):
-        row = start_row + 1 + i
-        mat_info = _get_material_info(valve)
-        design = _get_design_conditions(valve)
-        sch = valve.get("schedule", "STD")
-
-        ws.cell(row=row, column=1, value=i + 1)
-        ws.cell(row=row, column=2, value=valve["tag"])
-        ws.cell(row=row, column=3, value=_get_piping_spec(valve))
-        ws.cell(row=row, column=4, value=valve.get("location", ""))
-        ws.cell(row=row, column=5, value=valve.get("description", ""))
-        ws.cell(row=row, column=6, value=valve.get("fluid", ""))
-        ws.cell(row=row, column=7, value=design["press"])
-        ws.cell(row=row, column=8, value=design["temp"])
-        ws.cell(row=row, column=9, value=valve.get("valve_type", ""))
-        ws.cell(row=row, column=10, value=valve.get("valve_subtype", ""))
-        ws.cell(row=row, column=11, value=mat_info["body"])
-        ws.cell(row=row, column=12, value=mat_info["trim"])
-        ws.cell(row=row, column=13, value=int(valve["size"]) if valve.get("size", "").isdigit() else valve.get("size", ""))
-        ws.cell(row=row, column=14, value="ANSI")
-        ws.cell(row=row, column=15, value=mat_info["flange"])
-        ws.cell(row=row, column=16, value="FLG")
-        ws.cell(row=row, column=17, value="FLG")
-        ws.cell(row=row, column=18, value=mat_info["pipe_mat"])
-        ws.cell(row=row, column=19, value=sch)
-        ws.cell(row=row, column=20, value=sch)
-        ws.cell(row=row, column=21, value="-")
-        ws.cell(row=row, column=22, value=3)
-        ws.cell(row=row, column=23, value="-")
-        ws.cell(row=row, column=24, value="-")
-        ws.cell(row=row, column=25, value="-")
-        ws.cell(row=row, column=26, value=f"Sheet {valve.get('sheet', '')}")
-
-        for col in range(1, 27):
-            cell = ws.cell(row=row, column=col)
-            if col in ref_styles:
-                cell.font = copy(ref_styles[col]["font"])
-                cell.alignment = copy(ref_styles[col]["alignment"])
-                cell.border = copy(ref_styles[col]["border"])
+    sheet_labels = {}
+    _write_valve_section(ws, start_row + 1, manual_valves, from_template, ref_style_cols,
+                         sheet_labels)
 
     # Control Valve 섹션
     ctrl_start = start_row + 1 + len(manual_valves) + 1
     ws.cell(row=ctrl_start, column=1, value="2. Control Valve")
-    ws.cell(row=ctrl_start, column=1).font = Font(name="Arial", size=10, bold=True)
-
-    for i, valve in enumerate(control_valves):
-        row = ctrl_start + 1 + i
-        mat_info = _get_material_info(valve)
-        design = _get_design_conditions(valve)
-        sch = valve.get("schedule", "STD")
-
-        ws.cell(row=row, column=1, value=i + 1)
-        ws.cell(row=row, column=2, value=valve["tag"])
-        ws.cell(row=row, column=3, value=_get_piping_spec(valve))
-        ws.cell(row=row, column=4, value=valve.get("location", ""))
-        ws.cell(row=row, column=5, value=valve.get("description", ""))
-        ws.cell(row=row, column=6, value=valve.get("fluid", ""))
-        ws.cell(row=row, column=7, value=design["press"])
-        ws.cell(row=row, column=8, value=design["temp"])
-        ws.cell(row=row, column=9, value="CONTROL")
-        ws.cell(row=row, column=10, value=valve.get("valve_subtype", ""))
-        ws.cell(row=row, column=11, value=mat_info["body"])
-        ws.cell(row=row, column=12, value=mat_info["trim"])
-        ws.cell(row=row, column=13, value=int(valve["size"]) if valve.get("size", "").isdigit() else valve.get("size", ""))
-        ws.cell(row=row, column=14, value="ANSI")
-        ws.cell(row=row, column=15, value=mat_info["flange"])
-        ws.cell(row=row, column=16, value="FLG")
-        ws.cell(row=row, column=17, value="FLG")
-        ws.cell(row=row, column=18, value=mat_info["pipe_mat"])
-        ws.cell(row=row, column=19, value=sch)
-        ws.cell(row=row, column=20, value=sch)
-        ws.cell(row=row, column=21, value="-")
-        ws.cell(row=row, column=22, value=3)
-        ws.cell(row=row, column=23, value="-")
-        ws.cell(row=row, column=24, value="-")
-        ws.cell(row=row, column=25, value="-")
-        ws.cell(row=row, column=26, value=f"Sheet {valve.get('sheet', '')}")
-
-        for col in range(1, 27):
-            cell = ws.cell(row=row, column=col)
-            if col in ref_styles:
-                cell.font = copy(ref_styles[col]["font"])
-                cell.alignment = copy(ref_styles[col]["alignment"])
-                cell.border = copy(ref_styles[col]["border"])
+    ws.cell(row=ctrl_start, column=1).font = TOTAL_FONT
+
+    _write_valve_section(ws, ctrl_start + 1, control_valves, from_template, ref_style_cols,
+                         sheet_labels, valve_type="CONTROL")
 
     # 합계
     summary_row = ctrl_start + len(control_valves) + 2
     ws.cell(row=summary_row, column=1, value="TOTAL")
-    ws.cell(row=summary_row, column=1).font = Font(name="Arial", size=10, bold=True)
+    ws.cell(row=summary_row, column=1).font = TOTAL_FONT
     ws.cell(row=summary_row, column=2, value=f"Manual: {len(manual_valves)}, Control: {len(control_valves)}, Total: {len(valves)}")
-    ws.cell(row=summary_row, column=2).font = Font(name="Arial", size=10, bold=True)
+    ws.cell(row=summary_row, column=2).font = TOTAL_FONT
 
-    wb.save(output_path)
+    _save_workbook(wb, output_path)
     logger.info(f"Valve Excel saved: {output_path} ({len(valves)} valves)")
     return output_path
 
 
 def generate_pipe_bom_excel(pages_data: list[dict], output_path: str) -> str:
-    """PIPE BOM Excel 생성 (4개 시트)"""
-    wb = openpyxl.Workbook()
+    """PIPE BOM Excel 생성 (4개 시트, write-only 모드로 행 단위 스트리밍)"""
+    wb = openpyxl.Workbook(write_only=True)
+    _ensure_named_styles(wb)
+
+    # 페이지 정규화 - 이후 시트들은 dict 조회/문자열 조립 없이 norm 만 사용
+    # (dims_str / rev_str 는 빈 값일 때 "-" 로 미리 채워 둠)
+    norm = []
+    for pd in pages_data:
+        pipe_pieces = pd.get("pipe_pieces", ())
+        dims = pd.get("dimensions_mm", ())
+        other_dims = pd.get("other_dims", ())
+        dims_parts = []
+        if dims:
+            dims_parts.append(", ".join(str(d) for d in dims))
+        if other_dims:
+            dims_parts.append(", ".join(other_dims))
+        norm.append(PageRec(
+            pd["page"], pipe_pieces, [pp.rsplit("-", 1)[0] for pp in pipe_pieces],
+            pd.get("weld_items", ()), dims, other_dims,
+            pd.get("weld_count", 0), bool(pd.get("has_loose")), " + ".join(dims_parts) or "-",
+            ", ".join(pipe_pieces), "; ".join(pd.get("revision_notes", ())) or "-",
+        ))
+    total_pieces = sum(len(rec.pipe_pieces) for rec in norm)
 
     # === Sheet 1: Pipe Piece Summary ===
-    ws1 = wb.active
-    ws1.title = "Pipe Piece Summary"
+    ws1 = wb.create_sheet("Pipe Piece Summary")
 
     headers1 = ["NO.", "Page", "Pipe Piece No.", "Sub-pieces", "Weld Count",
                  "Loose Parts", "Pipe Lengths (mm)", "Total Length (mm)", "Revision Notes"]
-    for col, h in enumerate(headers1, 1):
-        ws1.cell(row=1, column=col, value=h)
-    _style_header(ws1, 1, len(headers1))
+    _set_widths(ws1, [6, 6, 45, 10, 10, 10, 30, 15, 40])
+    ws1.append(_header_cells(ws1, headers1))
 
-    row = 2
     total_welds = 0
     total_length = 0
     piece_no = 0
 
-    for pd in pages_data:
-        if not pd.get("pipe_pieces"):
+    for rec in norm:
+        if not rec.pipe_pieces:
             continue
         piece_no += 1
-        dims = pd.get("dimensions_mm", [])
-        total_dim = sum(dims) if dims else 0
+        total_dim = sum(rec.dims) if rec.dims else 0
         total_length += total_dim
-        total_welds += pd.get("weld_count", 0)
-
-        dims_str = ", ".join(str(d) for d in dims)
-        other_dims = pd.get("other_dims", [])
-        if other_dims:
-            dims_str += (" + " if dims_str else "") + ", ".join(other_dims)
-
-        rev = "; ".join(pd.get("revision_notes", []))
-
-        ws1.cell(row=row, column=1, value=piece_no)
-        ws1.cell(row=row, column=2, value=pd["page"])
-        ws1.cell(row=row, column=3, value=", ".join(pd["pipe_pieces"]))
-        ws1.cell(row=row, column=4, value=len(pd["pipe_pieces"]))
-        ws1.cell(row=row, column=5, value=pd.get("weld_count", 0))
-        ws1.cell(row=row, column=6, value="Yes" if pd.get("has_loose") else "-")
-        ws1.cell(row=row, column=7, value=dims_str if dims_str else "-")
-        ws1.cell(row=row, column=8, value=total_dim if total_dim > 0 else "-")
-        ws1.cell(row=row, column=9, value=rev if rev else "-")
-        _style_data(ws1, row, len(headers1))
-        row += 1
+        total_welds += rec.weld_count
+
+        ws1.append(_data_cells(ws1, [
+            piece_no,
+            rec.page,
+            rec.pieces_str,
+            len(rec.pipe_pieces),
+            rec.weld_count,
+            "Yes" if rec.has_loose else "-",
+            rec.dims_str,
+            total_dim if total_dim > 0 else "-",
+            rec.rev_str,
+        ], len(headers1)))
 
     # 합계
-    ws1.cell(row=row + 1, column=1, value="TOTAL")
-    ws1.cell(row=row + 1, column=4, value=sum(len(p.get("pipe_pieces", [])) for p in pages_data))
-    ws1.cell(row=row + 1, column=5, value=total_welds)
-    ws1.cell(row=row + 1, column=8, value=total_length if total_length > 0 else "-")
-    _style_data(ws1, row + 1, len(headers1),
-                font=Font(name="Arial", size=10, bold=True),
-                fill=PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid"))
-
-    for i, w in enumerate([6, 6, 45, 10, 10, 10, 30, 15, 40], 1):
-        ws1.column_dimensions[get_column_letter(i)].width = w
+    ws1.append([])
+    ws1.append(_data_cells(ws1, [
+        "TOTAL", None, None,
+        total_pieces,
+        total_welds, None, None,
+        total_length if total_length > 0 else "-",
+    ], len(headers1), BOM_TOTAL_STYLE))
 
     # === Sheet 2: Weld Item Detail ===
     ws2 = wb.create_sheet("Weld Item Detail")
     headers2 = ["NO.", "Page", "Pipe Piece", "Item No.", "Item Type", "Notes"]
-    for col, h in enumerate(headers2, 1):
-        ws2.cell(row=1, column=col, value=h)
-    _style_header(ws2, 1, len(headers2))
+    _set_widths(ws2, [6, 6, 45, 10, 25, 20])
+    ws2.append(_header_cells(ws2, headers2))
 
-    row = 2
     item_no = 0
-    for pd in pages_data:
-        for weld in pd.get("weld_items", []):
+    for rec in norm:
+        for weld in rec.weld_items:
             item_no += 1
-            piece_str = ", ".join(pd.get("pipe_pieces", []))
             item_type = "Field Fit Weld (+100mm)" if weld.startswith("FFW") else "Shop Weld"
-            ws2.cell(row=row, column=1, value=item_no)
-            ws2.cell(row=row, column=2, value=pd["page"])
-            ws2.cell(row=row, column=3, value=piece_str)
-            ws2.cell(row=row, column=4, value=weld)
-            ws2.cell(row=row, column=5, value=item_type)
-            ws2.cell(row=row, column=6, value="-")
-            _style_data(ws2, row, len(headers2))
-            row += 1
-
-    for i, w in enumerate([6, 6, 45, 10, 25, 20], 1):
-        ws2.column_dimensions[get_column_letter(i)].width = w
+            ws2.append(_data_cells(ws2, [item_no, rec.page, rec.pieces_str, weld, item_type, "-"],
+                                   len(headers2)))
 
     # === Sheet 3: Weld Quantity Summary ===
     ws3 = wb.create_sheet("Weld Quantity Summary")
 
     piece_summary = OrderedDict()
-    for pd in pages_data:
-        for pp in pd.get("pipe_pieces", []):
-            base = pp.rsplit("-", 1)[0]
-            if base not in piece_summary:
-                piece_summary[base] = {
-                    "sub_pieces": [], "shop_welds": 0, "field_welds": 0,
-                    "total_welds": 0, "pages": set(), "dims": [], "has_loose": False,
-                }
-            piece_summary[base]["sub_pieces"].append(pp)
-            piece_summary[base]["pages"].add(pd["page"])
-            if pd.get("has_loose"):
-                piece_summary[base]["has_loose"] = True
-
-        if pd.get("pipe_pieces"):
-            base = pd["pipe_pieces"][0].rsplit("-", 1)[0]
-            for w in pd.get("weld_items", []):
-                if w.startswith("FFW"):
-                    piece_summary[base]["field_welds"] += 1
-                else:
-                    piece_summary[base]["shop_welds"] += 1
-                piece_summary[base]["total_welds"] += 1
-            for d in pd.get("dimensions_mm", []):
-                piece_summary[base]["dims"].append(d)
+    for rec in norm:
+        if not rec.pipe_pieces:
+            continue
+        for pp, base in zip(rec.pipe_pieces, rec.bases):
+            info = _piece_slot(piece_summary, base)
+            info["sub_pieces"].append(pp)
+            info["pages"].add(rec.page)
+            if rec.has_loose:
+                info["has_loose"] = True
+
+        info = piece_summary[rec.bases[0]]
+        for w in rec.weld_items:
+            if w.startswith("FFW"):
+                info["field_welds"] += 1
+            else:
+                info["shop_welds"] += 1
+            info["total_welds"] += 1
+        info["dims"].extend(rec.dims)
 
     headers3 = ["NO.", "Pipe Piece Base", "Sub-piece Count", "Shop Welds",
                  "Field Welds", "Total Welds", "Has Loose", "Pipe Lengths (mm)",
                  "Total Length (mm)", "Pages"]
-    for col, h in enumerate(headers3, 1):
-        ws3.cell(row=1, column=col, value=h)
-    _style_header(ws3, 1, len(headers3))
+    _set_widths(ws3, [6, 18, 15, 12, 12, 12, 10, 30, 15, 15])
+    ws3.append(_header_cells(ws3, headers3))
 
-    row = 2
     grand_shop = grand_field = grand_total = grand_length = 0
 
     for idx, (base, info) in enumerate(sorted(piece_summary.items()), 1):
@@ -364,67 +485,52 @@ def generate_pipe_bom_excel(pages_data: list[dict], output_path: str) -> str:
         grand_total += info["total_welds"]
         grand_length += total_len
 
-        ws3.cell(row=row, column=1, value=idx)
-        ws3.cell(row=row, column=2, value=base)
-        ws3.cell(row=row, column=3, value=len(set(info["sub_pieces"])))
-        ws3.cell(row=row, column=4, value=info["shop_welds"])
-        ws3.cell(row=row, column=5, value=info["field_welds"])
-        ws3.cell(row=row, column=6, value=info["total_welds"])
-        ws3.cell(row=row, column=7, value="Yes" if info["has_loose"] else "-")
-        ws3.cell(row=row, column=8, value=", ".join(str(d) for d in info["dims"]) if info["dims"] else "-")
-        ws3.cell(row=row, column=9, value=total_len if total_len > 0 else "-")
-        ws3.cell(row=row, column=10, value=", ".join(str(p) for p in sorted(info["pages"])))
-        _style_data(ws3, row, len(headers3))
-        row += 1
-
-    ws3.cell(row=row + 1, column=1, value="TOTAL")
-    ws3.cell(row=row + 1, column=3, value=sum(len(set(v["sub_pieces"])) for v in piece_summary.values()))
-    ws3.cell(row=row + 1, column=4, value=grand_shop)
-    ws3.cell(row=row + 1, column=5, value=grand_field)
-    ws3.cell(row=row + 1, column=6, value=grand_total)
-    ws3.cell(row=row + 1, column=9, value=grand_length if grand_length > 0 else "-")
-    _style_data(ws3, row + 1, len(headers3),
-                font=Font(name="Arial", size=10, bold=True),
-                fill=PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid"))
-
-    for i, w in enumerate([6, 18, 15, 12, 12, 12, 10, 30, 15, 15], 1):
-        ws3.column_dimensions[get_column_letter(i)].width = w
+        ws3.append(_data_cells(ws3, [
+            idx,
+            base,
+            len(set(info["sub_pieces"])),
+            info["shop_welds"],
+            info["field_welds"],
+            info["total_welds"],
+            "Yes" if info["has_loose"] else "-",
+            ", ".join(str(d) for d in info["dims"]) if info["dims"] else "-",
+            total_len if total_len > 0 else "-",
+            ", ".join(str(p) for p in sorted(info["pages"])),
+        ], len(headers3)))
+
+    ws3.append([])
+    ws3.append(_data_cells(ws3, [
+        "TOTAL", None,
+        sum(len(set(v["sub_pieces"])) for v in piece_summary.values()),
+        grand_shop, grand_field, grand_total, None, None,
+        grand_length if grand_length > 0 else "-",
+    ], len(headers3), BOM_TOTAL_STYLE))
 
     # === Sheet 4: Statistics ===
     ws4 = wb.create_sheet("Statistics")
-    stats = [
-        ("PIPE BOM STATISTICS", ""),
-        ("", ""),
-        ("Total Pages", len(pages_data)),
-        ("Total Pipe Pieces", sum(len(p.get("pipe_pieces", [])) for p in pages_data)),
-        ("Unique Base Pieces", len(piece_summary)),
-        ("", ""),
-        ("WELD SUMMARY", ""),
-        ("Total Shop Welds", grand_shop),
-        ("Total Field Welds (FFW)", grand_field),
-        ("Total Welds", grand_total),
-        ("", ""),
-        ("PIPE LENGTH SUMMARY", ""),
-        ("Total Measured Length (mm)", grand_length),
-        ("Total Measured Length (m)", round(grand_length / 1000, 2) if grand_length else 0),
-        ("", ""),
-        ("LOOSE PARTS", ""),
-        ("Pages with Loose Parts", sum(1 for p in pages_data if p.get("has_loose"))),
-    ]
-
-    for r, (label, value) in enumerate(stats, 1):
-        ws4.cell(row=r, column=1, value=label)
-        ws4.cell(row=r, column=2, value=value)
-        if label and not value and label == label.upper():
-            ws4.cell(row=r, column=1).font = Font(name="Arial", size=11, bold=True)
-        else:
-            ws4.cell(row=r, column=1).font = Font(name="Arial", size=10)
-            ws4.cell(row=r, column=2).font = Font(name="Arial", size=10)
+    stats = (
+        ("PIPE BOM STATISTICS", "", True),
+        ("", "", False),
+        ("Total Pages", len(pages_data), False),
+        ("Total Pipe Pieces", total_pieces, False),
+        ("Unique Base Pieces", len(piece_summary), False),
+        ("", "", False),
+        ("WELD SUMMARY", "", True),
+        ("Total Shop Welds", grand_shop, False),
+        ("Total Field Welds (FFW)", grand_field, False),
+        ("Total Welds", grand_total, False),
+        ("", "", False),
+        ("PIPE LENGTH SUMMARY", "", True),
+        ("Total Measured Length (mm)", grand_length, False),
+        ("Total Measured Length (m)", round(grand_length / 1000, 2) if grand_length else 0, False),
+        ("", "", False),
+        ("LOOSE PARTS", "", True),
+        ("Pages with Loose Parts", sum(1 for rec in norm if rec.has_loose), False),
+    )
 
-    ws4.column_dimensions["A"].width = 35
-    ws4.column_dimensions["B"].width = 50
+    _write_stats(ws4, stats)
 
-    wb.save(output_path)
+    _save_workbook(wb, output_path)
     logger.info(f"Pipe BOM Excel saved: {output_path}")
     return output_path
 
@@ -449,419 +555,379 @@ STATUS_FILL_MAP = {
 
 
 def generate_vlm_bom_excel(vlm_data: list[dict], output_path: str) -> str:
-    """VLM 분석 기반 정밀 PIPE BOM Excel 생성 (7개 시트)"""
-    wb = openpyxl.Workbook()
+    """VLM 분석 기반 정밀 PIPE BOM Excel 생성 (7개 시트, write-only 모드로 행 단위 스트리밍)"""
+    wb = openpyxl.Workbook(write_only=True)
+    _ensure_named_styles(wb)
 
+    # 시트는 출력 순서대로 먼저 만들고, vlm_data 1회 순회로 모든 시트에 행을 추가
     # === Sheet 1: BOM Item List (전체 품목 + 비교 결과) ===
-    ws1 = wb.active
-    ws1.title = "BOM Item List"
+    ws1 = wb.create_sheet("BOM Item List")
     h1 = ["Page", "Drawing No.", "Line No.", "Code", "Qty", "Size",
           "Description", "Material Spec", "Weight (kg)", "Remarks",
           "Drawing Qty", "Match Status", "Diff"]
-    for col, h in enumerate(h1, 1):
-        ws1.cell(row=1, column=col, value=h)
-    _style_header(ws1, 1, len(h1))
+    _set_widths(ws1, [6, 16, 8, 6, 8, 8, 40, 30, 10, 15, 10, 12, 6])
+    ws1.append(_header_cells(ws1, h1))
+
+    # === Sheet 2: Pipe Pieces ===
+    ws2 = wb.create_sheet("Pipe Pieces")
+    h2 = ["Page", "Drawing No.", "Pipe Group", "Piece ID", "Size", "Schedule", "Material"]
+    _set_widths(ws2, [6, 15, 12, 15, 8, 10, 15])
+    ws2.append(_header_cells(ws2, h2))
+
+    # === Sheet 3: Components (Valves + Fittings) ===
+    ws3 = wb.create_sheet("Components")
+    h3 = ["Page", "Drawing No.", "Type", "Sub-type", "Size", "Tag", "Description", "Qty"]
+    _set_widths(ws3, [6, 15, 10, 18, 8, 12, 35, 5])
+    ws3.append(_header_cells(ws3, h3))
+
+    # === Sheet 4: Weld Points ===
+    ws4 = wb.create_sheet("Weld Points")
+    h4 = ["Page", "Drawing No.", "Weld ID", "Weld Type", "Notes"]
+    _set_widths(ws4, [6, 15, 10, 20, 20])
+    ws4.append(_header_cells(ws4, h4))
+
+    # === Sheet 5: Dimensions ===
+    ws5 = wb.create_sheet("Dimensions")
+    h5 = ["Page", "From Point", "To Point", "Length (mm)", "Direction"]
+    _set_widths(ws5, [6, 12, 12, 12, 12])
+    ws5.append(_header_cells(ws5, h5))
+
+    # === Sheet 6: Cut Lengths ===
+    ws6 = wb.create_sheet("Cut Lengths")
+    h6 = ["Page", "Drawing No.", "Line No.", "Cut No.", "Length (mm)"]
+    _set_widths(ws6, [6, 16, 8, 8, 12])
+    ws6.append(_header_cells(ws6, h6))
+
+    # === Sheet 7: Drawing Index ===
+    ws7_idx = wb.create_sheet("Drawing Index")
+    h7 = ["Page", "Drawing No.", "Line No.", "Pipe No.", "Line Description",
+          "Pipe Pieces", "Shop Welds", "Field Welds", "BOM Items", "Cut Lengths",
+          "Total Weight (kg)", "Revision"]
+    _set_widths(ws7_idx, [6, 16, 8, 12, 35, 10, 10, 10, 10, 10, 12, 8])
+    ws7_idx.append(_header_cells(ws7_idx, h7))
+
+    # === Sheet 8: Summary Statistics (순회 후 기록) ===
+    ws_summary = wb.create_sheet("Summary")
+
+    # === Sheet 9: BOM Comparison (비교 상세) ===
+    has_comparison = any(pd.get("comparison") for pd in vlm_data)
+    if has_comparison:
+        ws_comp = wb.create_sheet("BOM Comparison")
+        hc = ["Page", "Drawing No.", "BOM Code", "BOM Description", "BOM Qty",
+              "BOM Size", "Drawing Component", "Drawing Qty", "Status", "Diff", "Notes"]
+        _set_widths(ws_comp, [6, 16, 8, 35, 8, 8, 20, 10, 12, 6, 30])
+        ws_comp.append(_header_cells(ws_comp, hc))
+
+        # === Sheet 10: Comparison Summary (비교 요약) ===
+        ws_cs = wb.create_sheet("Comparison Summary")
+        hcs = ["Page", "Drawing No.", "Line No.", "BOM Items", "Comparable",
+               "Matched", "Mismatched", "BOM Only", "Drawing Only", "Match Rate (%)"]
+        _set_widths(ws_cs, [6, 16, 8, 10, 10, 10, 10, 10, 10, 12])
+        ws_cs.append(_header_cells(ws_cs, hcs))
 
-    row = 2
     total_items = 0
     total_weight = 0
+    valve_count = 0
+    fitting_count = 0
+    other_comp_count = 0
+    shop_welds = 0
+    field_welds = 0
+    total_length = 0
+    total_cut_length = 0
+    pages_with_data = drawing_ok = table_ok = 0
+    total_pipe_pieces = total_dim_entries = total_cut_entries = 0
+    tot_matched = tot_mismatched = tot_bom_only = tot_drawing_only = tot_comparable = 0
+
+    append1 = ws1.append
+    append2 = ws2.append
+    append3 = ws3.append
+    append4 = ws4.append
+    append5 = ws5.append
+    append6 = ws6.append
+    append7 = ws7_idx.append
+    status_fill = STATUS_FILL_MAP.get
+    accent_fill = ACCENT_FILL
+    warn_fill = WARN_FILL
     for page_data in vlm_data:
+        # 페이지 공통 값 (모든 시트에서 공유)
         page = page_data.get("page", 0)
         dwg_no = page_data.get("drawing_number", "")
-        line_no = page_data.get("line_no", "") or (page_data.get("drawing_info", {}) or {}).get("line_no", "")
-
-        # 비교 데이터 (letter_code 기준 lookup)
+        di = page_data.get("drawing_info", {}) or {}
+        line_no = page_data.get("line_no", "") or di.get("line_no", "")
+        bom_table = page_data.get("bom_table", ())
+        pipe_pieces = page_data.get("pipe_pieces", ())
+        weld_points = page_data.get("weld_points", ())
+        dimensions = page_data.get("dimensions_mm", ())
+        cut_lengths = page_data.get("cut_lengths", ())
         comparison = page_data.get("comparison", {})
-        comp_items_map = {}
-        for ci in comparison.get("comparison_items", []):
-            letter = ci.get("bom_letter", "")
-            if letter:
-                comp_items_map[letter] = ci
 
-        for item in page_data.get("bom_table", []):
+        if pipe_pieces or bom_table:
+            pages_with_data += 1
+        if page_data.get("drawing_analysis_ok"):
+            drawing_ok += 1
+        if page_data.get("table_analysis_ok"):
+            table_ok += 1
+        total_pipe_pieces += len(pipe_pieces)
+        total_dim_entries += len(dimensions)
+        total_cut_entries += len(cut_lengths)
+
+        # Sheet 1: BOM Item List - 비교 데이터 (letter_code 기준 lookup, BOM 행이 있을 때만 구성)
+        comp_get = None
+        if bom_table and comparison:
+            comp_items_map = {}
+            for ci in comparison.get("comparison_items", ()):
+                letter = ci.get("bom_letter", "")
+                if letter:
+                    comp_items_map[letter] = ci
+            if comp_items_map:
+                comp_get = comp_items_map.get
+
+        bom_wt = 0
+        for item in bom_table:
             total_items += 1
             code = item.get("letter_code", "") or item.get("item_no", "")
             wt = item.get("weight_kg", 0)
-            if isinstance(wt, (int, float)) and wt > 0:
-                total_weight += wt
-            ws1.cell(row=row, column=1, value=page)
-            ws1.cell(row=row, column=2, value=dwg_no)
-            ws1.cell(row=row, column=3, value=line_no)
-            ws1.cell(row=row, column=4, value=code)
-            ws1.cell(row=row, column=5, value=item.get("quantity", ""))
-            ws1.cell(row=row, column=6, value=item.get("size_inches", item.get("size", "")))
-            ws1.cell(row=row, column=7, value=item.get("description", ""))
-            ws1.cell(row=row, column=8, value=item.get("material_spec", item.get("material", "")))
-            ws1.cell(row=row, column=9, value=wt if wt else "")
-            ws1.cell(row=row, column=10, value=item.get("remarks", ""))
-
-            # 비교 결과 컬럼
-            ci = comp_items_map.get(code, {})
-            match_status = ci.get("match_status", "")
-            ws1.cell(row=row, column=11, value=ci.get("drawing_quantity", ""))
-            ws1.cell(row=row, column=12, value=match_status)
-            ws1.cell(row=row, column=13, value=ci.get("quantity_diff", "") if ci.get("quantity_diff") else "")
+            if isinstance(wt, (int, float)):
+                bom_wt += wt
+                if wt > 0:
+                    total_weight += wt
+
+            values = [
+                page,
+                dwg_no,
+                line_no,
+                code,
+                item.get("quantity", ""),
+                item.get("size_inches", item.get("size", "")),
+                item.get("description", ""),
+                item.get("material_spec", item.get("material", "")),
+                wt if wt else "",
+                item.get("remarks", ""),
+            ]
+
+            # 비교 결과 컬럼 - 비교 데이터가 없는 페이지는 빈 칸으로 바로 기록
+            ci = comp_get(code) if comp_get else None
+            if ci is None:
+                values += ("", "", "")
+                append1(_data_cells(ws1, values, len(h1)))
+                continue
 
-            _style_data(ws1, row, len(h1))
+            match_status = ci.get("match_status", "")
+            qty_diff = ci.get("quantity_diff", "")
+            values += (ci.get("drawing_quantity", ""), match_status, qty_diff if qty_diff else "")
+            cells = _data_cells(ws1, values, len(h1))
 
             # 비교 상태별 색상
-            fill = STATUS_FILL_MAP.get(match_status)
+            fill = status_fill(match_status)
             if fill:
-                for c in range(11, 14):
-                    ws1.cell(row=row, column=c).fill = fill
-
-            row += 1
-
-    for i, w in enumerate([6, 16, 8, 6, 8, 8, 40, 30, 10, 15, 10, 12, 6], 1):
-        ws1.column_dimensions[get_column_letter(i)].width = w
+                for cell in cells[10:13]:
+                    cell.fill = fill
 
-    # === Sheet 2: Pipe Pieces ===
-    ws2 = wb.create_sheet("Pipe Pieces")
-    h2 = ["Page", "Drawing No.", "Pipe Group", "Piece ID", "Size", "Schedule", "Material"]
-    for col, h in enumerate(h2, 1):
-        ws2.cell(row=1, column=col, value=h)
-    _style_header(ws2, 1, len(h2))
+            append1(cells)
 
-    row = 2
-    for page_data in vlm_data:
-        page = page_data.get("page", 0)
-        dwg_no = page_data.get("drawing_number", "")
+        # Sheet 2: Pipe Pieces
         pg = page_data.get("pipe_group", "")
-        for pp in page_data.get("pipe_pieces", []):
+        for pp in pipe_pieces:
             if isinstance(pp, dict):
-                ws2.cell(row=row, column=1, value=page)
-                ws2.cell(row=row, column=2, value=dwg_no)
-                ws2.cell(row=row, column=3, value=pg)
-                ws2.cell(row=row, column=4, value=pp.get("id", ""))
-                ws2.cell(row=row, column=5, value=pp.get("size", ""))
-                ws2.cell(row=row, column=6, value=pp.get("schedule", ""))
-                ws2.cell(row=row, column=7, value=pp.get("material", ""))
+                values = [page, dwg_no, pg, pp.get("id", ""), pp.get("size", ""),
+                          pp.get("schedule", ""), pp.get("material", "")]
             else:
-                ws2.cell(row=row, column=1, value=page)
-                ws2.cell(row=row, column=2, value=dwg_no)
-                ws2.cell(row=row, column=3, value=pg)
-                ws2.cell(row=row, column=4, value=str(pp))
-            _style_data(ws2, row, len(h2))
-            row += 1
+                values = [page, dwg_no, pg, str(pp)]
+            append2(_data_cells(ws2, values, len(h2)))
 
-    for i, w in enumerate([6, 15, 12, 15, 8, 10, 15], 1):
-        ws2.column_dimensions[get_column_letter(i)].width = w
-
-    # === Sheet 3: Components (Valves + Fittings) ===
-    ws3 = wb.create_sheet("Components")
-    h3 = ["Page", "Drawing No.", "Type", "Sub-type", "Size", "Tag", "Description", "Qty"]
-    for col, h in enumerate(h3, 1):
-        ws3.cell(row=1, column=col, value=h)
-    _style_header(ws3, 1, len(h3))
-
-    row = 2
-    valve_count = 0
-    fitting_count = 0
-    for page_data in vlm_data:
-        page = page_data.get("page", 0)
-        dwg_no = page_data.get("drawing_number", "")
-        for comp in page_data.get("components", []):
+        # Sheet 3: Components
+        for comp in page_data.get("components", ()):
             ctype = comp.get("type", "")
             if ctype == "valve":
                 valve_count += comp.get("quantity", 1)
             elif ctype == "fitting":
                 fitting_count += comp.get("quantity", 1)
-            ws3.cell(row=row, column=1, value=page)
-            ws3.cell(row=row, column=2, value=dwg_no)
-            ws3.cell(row=row, column=3, value=ctype.upper())
-            ws3.cell(row=row, column=4, value=comp.get("subtype", ""))
-            ws3.cell(row=row, column=5, value=comp.get("size", ""))
-            ws3.cell(row=row, column=6, value=comp.get("tag", ""))
-            ws3.cell(row=row, column=7, value=comp.get("description", ""))
-            ws3.cell(row=row, column=8, value=comp.get("quantity", 1))
-            fill = ACCENT_FILL if ctype == "valve" else None
-            _style_data(ws3, row, len(h3), fill=fill)
-            row += 1
-
-    for i, w in enumerate([6, 15, 10, 18, 8, 12, 35, 5], 1):
-        ws3.column_dimensions[get_column_letter(i)].width = w
-
-    # === Sheet 4: Weld Points ===
-    ws4 = wb.create_sheet("Weld Points")
-    h4 = ["Page", "Drawing No.", "Weld ID", "Weld Type", "Notes"]
-    for col, h in enumerate(h4, 1):
-        ws4.cell(row=1, column=col, value=h)
-    _style_header(ws4, 1, len(h4))
-
-    row = 2
-    shop_welds = 0
-    field_welds = 0
-    for page_data in vlm_data:
-        page = page_data.get("page", 0)
-        dwg_no = page_data.get("drawing_number", "")
-        for wp in page_data.get("weld_points", []):
-            wid = wp.get("id", "") if isinstance(wp, dict) else str(wp)
-            wtype = wp.get("type", "shop_weld") if isinstance(wp, dict) else (
-                "field_fit_weld" if "FFW" in str(wp).upper() else "shop_weld")
-            if "field" in wtype.lower():
+            else:
+                other_comp_count += 1
+            values = [
+                page,
+                dwg_no,
+                ctype.upper(),
+                comp.get("subtype", ""),
+                comp.get("size", ""),
+                comp.get("tag", ""),
+                comp.get("description", ""),
+                comp.get("quantity", 1),
+            ]
+            if ctype == "valve":
+                append3(_data_cells_fill(ws3, values, len(h3), accent_fill))
+            else:
+                append3(_data_cells(ws3, values, len(h3)))
+
+        # Sheet 4: Weld Points (Drawing Index 용 페이지별 shop/field 수는 dict 항목만 집계)
+        page_sw = page_fw = 0
+        for wp in weld_points:
+            if isinstance(wp, dict):
+                wid = wp.get("id", "")
+                wtype = wp.get("type", "shop_weld")
+                is_field = "field" in wtype.lower()
+                if is_field:
+                    page_fw += 1
+                else:
+                    page_sw += 1
+            else:
+                wid = str(wp)
+                wtype = "field_fit_weld" if "FFW" in wid.upper() else "shop_weld"
+                is_field = "field" in wtype
+            if is_field:
                 field_welds += 1
             else:
                 shop_welds += 1
-            ws4.cell(row=row, column=1, value=page)
-            ws4.cell(row=row, column=2, value=dwg_no)
-            ws4.cell(row=row, column=3, value=wid)
-            ws4.cell(row=row, column=4, value=wtype)
-            ws4.cell(row=row, column=5, value="")
-            fill = WARN_FILL if "field" in wtype.lower() else None
-            _style_data(ws4, row, len(h4), fill=fill)
-            row += 1
-
-    for i, w in enumerate([6, 15, 10, 20, 20], 1):
-        ws4.column_dimensions[get_column_letter(i)].width = w
-
-    # === Sheet 5: Dimensions ===
-    ws5 = wb.create_sheet("Dimensions")
-    h5 = ["Page", "From Point", "To Point", "Length (mm)", "Direction"]
-    for col, h in enumerate(h5, 1):
-        ws5.cell(row=1, column=col, value=h)
-    _style_header(ws5, 1, len(h5))
+            values = [page, dwg_no, wid, wtype, ""]
+            if is_field:
+                append4(_data_cells_fill(ws4, values, len(h4), warn_fill))
+            else:
+                append4(_data_cells(ws4, values, len(h4)))
 
-    row = 2
-    total_length = 0
-    for page_data in vlm_data:
-        page = page_data.get("page", 0)
-        for dim in page_data.get("dimensions_mm", []):
+        # Sheet 5: Dimensions
+        for dim in dimensions:
             if isinstance(dim, dict):
                 length = dim.get("length_mm", 0)
                 total_length += length if isinstance(length, (int, float)) else 0
-                ws5.cell(row=row, column=1, value=page)
-                ws5.cell(row=row, column=2, value=dim.get("from_point", ""))
-                ws5.cell(row=row, column=3, value=dim.get("to_point", ""))
-                ws5.cell(row=row, column=4, value=length)
-                ws5.cell(row=row, column=5, value=dim.get("direction", ""))
+                values = [page, dim.get("from_point", ""), dim.get("to_point", ""),
+                          length, dim.get("direction", "")]
             else:
                 total_length += dim if isinstance(dim, (int, float)) else 0
-                ws5.cell(row=row, column=1, value=page)
-                ws5.cell(row=row, column=4, value=dim)
-            _style_data(ws5, row, len(h5))
-            row += 1
-
-    for i, w in enumerate([6, 12, 12, 12, 12], 1):
-        ws5.column_dimensions[get_column_letter(i)].width = w
-
-    # === Sheet 6: Cut Lengths ===
-    ws6 = wb.create_sheet("Cut Lengths")
-    h6 = ["Page", "Drawing No.", "Line No.", "Cut No.", "Length (mm)"]
-    for col, h in enumerate(h6, 1):
-        ws6.cell(row=1, column=col, value=h)
-    _style_header(ws6, 1, len(h6))
+                values = [page, None, None, dim]
+            append5(_data_cells(ws5, values, len(h5)))
 
-    row = 2
-    total_cut_length = 0
-    for page_data in vlm_data:
-        page = page_data.get("page", 0)
-        dwg_no = page_data.get("drawing_number", "")
-        line_no = page_data.get("line_no", "") or (page_data.get("drawing_info", {}) or {}).get("line_no", "")
-        for cut in page_data.get("cut_lengths", []):
+        # Sheet 6: Cut Lengths
+        for cut in cut_lengths:
             if isinstance(cut, dict):
                 length = cut.get("length_mm", 0)
                 total_cut_length += length if isinstance(length, (int, float)) else 0
-                ws6.cell(row=row, column=1, value=page)
-                ws6.cell(row=row, column=2, value=dwg_no)
-                ws6.cell(row=row, column=3, value=line_no)
-                ws6.cell(row=row, column=4, value=cut.get("cut_no", ""))
-                ws6.cell(row=row, column=5, value=length)
-                _style_data(ws6, row, len(h6))
-                row += 1
-
-    for i, w in enumerate([6, 16, 8, 8, 12], 1):
-        ws6.column_dimensions[get_column_letter(i)].width = w
-
-    # === Sheet 7: Drawing Index ===
-    ws7_idx = wb.create_sheet("Drawing Index")
-    h7 = ["Page", "Drawing No.", "Line No.", "Pipe No.", "Line Description",
-          "Pipe Pieces", "Shop Welds", "Field Welds", "BOM Items", "Cut Lengths",
-          "Total Weight (kg)", "Revision"]
-    for col, h in enumerate(h7, 1):
-        ws7_idx.cell(row=1, column=col, value=h)
-    _style_header(ws7_idx, 1, len(h7))
-
-    row = 2
-    for page_data in vlm_data:
-        di = page_data.get("drawing_info", {}) or {}
-        ws7_idx.cell(row=row, column=1, value=page_data.get("page", 0))
-        ws7_idx.cell(row=row, column=2, value=page_data.get("drawing_number", ""))
-        ws7_idx.cell(row=row, column=3, value=page_data.get("line_no", "") or di.get("line_no", ""))
-        ws7_idx.cell(row=row, column=4, value=page_data.get("pipe_no", "") or di.get("pipe_no", ""))
-        ws7_idx.cell(row=row, column=5, value=page_data.get("line_description", "") or di.get("line_description", ""))
-        ws7_idx.cell(row=row, column=6, value=len(page_data.get("pipe_pieces", [])))
-        sw = sum(1 for w in page_data.get("weld_points", [])
-                 if isinstance(w, dict) and "field" not in w.get("type", "").lower())
-        fw = sum(1 for w in page_data.get("weld_points", [])
-                 if isinstance(w, dict) and "field" in w.get("type", "").lower())
-        ws7_idx.cell(row=row, column=7, value=sw)
-        ws7_idx.cell(row=row, column=8, value=fw)
-        ws7_idx.cell(row=row, column=9, value=len(page_data.get("bom_table", [])))
-        ws7_idx.cell(row=row, column=10, value=len(page_data.get("cut_lengths", [])))
-        bom_wt = sum(item.get("weight_kg", 0) for item in page_data.get("bom_table", [])
-                     if isinstance(item.get("weight_kg"), (int, float)))
-        ws7_idx.cell(row=row, column=11, value=bom_wt if bom_wt else "")
-        ws7_idx.cell(row=row, column=12, value=di.get("revision", ""))
-        _style_data(ws7_idx, row, len(h7))
-        row += 1
-
-    for i, w in enumerate([6, 16, 8, 12, 35, 10, 10, 10, 10, 10, 12, 8], 1):
-        ws7_idx.column_dimensions[get_column_letter(i)].width = w
-
-    # === Sheet 8: Summary Statistics ===
-    ws_summary = wb.create_sheet("Summary")
-    stats = [
-        ("VLM PIPE BOM EXTRACTION REPORT", ""),
-        ("", ""),
-        ("OVERVIEW", ""),
-        ("Total Pages Analyzed", len(vlm_data)),
-        ("Pages with Data", sum(1 for r in vlm_data if r.get("pipe_pieces") or r.get("bom_table"))),
-        ("Drawing Analysis Success", sum(1 for r in vlm_data if r.get("drawing_analysis_ok"))),
-        ("Table Analysis Success", sum(1 for r in vlm_data if r.get("table_analysis_ok"))),
-        ("", ""),
-        ("PIPE PIECES", ""),
-        ("Total Pipe Pieces", sum(len(r.get("pipe_pieces", [])) for r in vlm_data)),
-        ("", ""),
-        ("COMPONENTS", ""),
-        ("Total Valves", valve_count),
-        ("Total Fittings", fitting_count),
-        ("Total Other Components", sum(
-            sum(1 for c in r.get("components", []) if c.get("type") not in ("valve", "fitting"))
-            for r in vlm_data)),
-        ("", ""),
-        ("WELDING", ""),
-        ("Total Shop Welds", shop_welds),
-        ("Total Field Fit Welds", field_welds),
-        ("Total Welds", shop_welds + field_welds),
-        ("", ""),
-        ("DIMENSIONS", ""),
-        ("Total Dimension Entries", sum(len(r.get("dimensions_mm", [])) for r in vlm_data)),
-        ("Total Pipe Length (mm)", total_length),
-        ("Total Pipe Length (m)", round(total_length / 1000, 2) if total_length else 0),
-        ("", ""),
-        ("CUT LENGTHS", ""),
-        ("Total Cut Entries", sum(len(r.get("cut_lengths", [])) for r in vlm_data)),
-        ("Total Cut Length (mm)", total_cut_length),
-        ("Total Cut Length (m)", round(total_cut_length / 1000, 2) if total_cut_length else 0),
-        ("", ""),
-        ("BOM TABLE", ""),
-        ("Total BOM Items", total_items),
-        ("Total Weight (kg)", round(total_weight, 1)),
-    ]
+                append6(_data_cells(ws6, [page, dwg_no, line_no, cut.get("cut_no", ""), length],
+                                    len(h6)))
+
+        # Sheet 7: Drawing Index
+        append7(_data_cells(ws7_idx, [
+            page,
+            dwg_no,
+            line_no,
+            page_data.get("pipe_no", "") or di.get("pipe_no", ""),
+            page_data.get("line_description", "") or di.get("line_description", ""),
+            len(pipe_pieces),
+            page_sw,
+            page_fw,
+            len(bom_table),
+            len(cut_lengths),
+            bom_wt if bom_wt else "",
+            di.get("revision", ""),
+        ], len(h7)))
+
+        if not comparison:
+            continue
 
-    for r, (label, value) in enumerate(stats, 1):
-        ws_summary.cell(row=r, column=1, value=label)
-        ws_summary.cell(row=r, column=2, value=value)
-        if label and not value and label == label.upper():
-            ws_summary.cell(row=r, column=1).font = Font(name="Arial", size=11, bold=True)
-        else:
-            ws_summary.cell(row=r, column=1).font = Font(name="Arial", size=10)
-            ws_summary.cell(row=r, column=2).font = Font(name="Arial", size=10)
+        # Sheet 9: BOM Comparison
+        cpage = comparison.get("page", page)
+        cdwg_no = comparison.get("drawing_number", dwg_no)
+        for ci in comparison.get("comparison_items", ()):
+            status = ci.get("match_status", "")
+            values = [
+                cpage,
+                cdwg_no,
+                ci.get("bom_letter", ""),
+                ci.get("bom_description", ""),
+                ci.get("bom_quantity", ""),
+                ci.get("bom_size", ""),
+                ci.get("drawing_component", ""),
+                ci.get("drawing_quantity", ""),
+                status,
+                ci.get("quantity_diff", ""),
+                ci.get("notes", ""),
+            ]
+            fill = status_fill(status)
+            if fill:
+                ws_comp.append(_data_cells_fill(ws_comp, values, len(hc), fill))
+            else:
+                ws_comp.append(_data_cells(ws_comp, values, len(hc)))
+
+        # Sheet 10: Comparison Summary
+        summary = comparison.get("summary", {})
+        matched = summary.get("matched", 0)
+        mismatched = summary.get("mismatched", 0)
+        bom_only = summary.get("bom_only", 0)
+        drawing_only = summary.get("drawing_only", 0)
+        comparable = summary.get("comparable_items", 0)
+        tot_matched += matched
+        tot_mismatched += mismatched
+        tot_bom_only += bom_only
+        tot_drawing_only += drawing_only
+        tot_comparable += comparable
+
+        cells = _data_cells(ws_cs, [
+            comparison.get("page", 0),
+            comparison.get("drawing_number", ""),
+            comparison.get("line_no", ""),
+            summary.get("total_bom_items", 0),
+            comparable,
+            matched,
+            mismatched,
+            bom_only,
+            drawing_only,
+            summary.get("match_rate", 0),
+        ], len(hcs))
+
+        # 낮은 일치율 강조
+        if summary.get("match_rate", 100) < 50:
+            cells[9].fill = MISMATCH_FILL
+        ws_cs.append(cells)
+
+    stats = (
+        ("VLM PIPE BOM EXTRACTION REPORT", "", True),
+        ("", "", False),
+        ("OVERVIEW", "", True),
+        ("Total Pages Analyzed", len(vlm_data), False),
+        ("Pages with Data", pages_with_data, False),
+        ("Drawing Analysis Success", drawing_ok, False),
+        ("Table Analysis Success", table_ok, False),
+        ("", "", False),
+        ("PIPE PIECES", "", True),
+        ("Total Pipe Pieces", total_pipe_pieces, False),
+        ("", "", False),
+        ("COMPONENTS", "", True),
+        ("Total Valves", valve_count, False),
+        ("Total Fittings", fitting_count, False),
+        ("Total Other Components", other_comp_count, False),
+        ("", "", False),
+        ("WELDING", "", True),
+        ("Total Shop Welds", shop_welds, False),
+        ("Total Field Fit Welds", field_welds, False),
+        ("Total Welds", shop_welds + field_welds, False),
+        ("", "", False),
+        ("DIMENSIONS", "", True),
+        ("Total Dimension Entries", total_dim_entries, False),
+        ("Total Pipe Length (mm)", total_length, False),
+        ("Total Pipe Length (m)", round(total_length / 1000, 2) if total_length else 0, False),
+        ("", "", False),
+        ("CUT LENGTHS", "", True),
+        ("Total Cut Entries", total_cut_entries, False),
+        ("Total Cut Length (mm)", total_cut_length, False),
+        ("Total Cut Length (m)", round(total_cut_length / 1000, 2) if total_cut_length else 0, False),
+        ("", "", False),
+        ("BOM TABLE", "", True),
+        ("Total BOM Items", total_items, False),
+        ("Total Weight (kg)", round(total_weight, 1), False),
+    )
 
-    ws_summary.column_dimensions["A"].width = 35
-    ws_summary.column_dimensions["B"].width = 50
+    _write_stats(ws_summary, stats)
 
-    # === Sheet 9: BOM Comparison (비교 상세) ===
-    has_comparison = any(pd.get("comparison") for pd in vlm_data)
     if has_comparison:
-        ws_comp = wb.create_sheet("BOM Comparison")
-        hc = ["Page", "Drawing No.", "BOM Code", "BOM Description", "BOM Qty",
-              "BOM Size", "Drawing Component", "Drawing Qty", "Status", "Diff", "Notes"]
-        for col, h in enumerate(hc, 1):
-            ws_comp.cell(row=1, column=col, value=h)
-        _style_header(ws_comp, 1, len(hc))
-
-        row = 2
-        for page_data in vlm_data:
-            comparison = page_data.get("comparison", {})
-            if not comparison:
-                continue
-            page = comparison.get("page", page_data.get("page", 0))
-            dwg_no = comparison.get("drawing_number", page_data.get("drawing_number", ""))
-            for ci in comparison.get("comparison_items", []):
-                ws_comp.cell(row=row, column=1, value=page)
-                ws_comp.cell(row=row, column=2, value=dwg_no)
-                ws_comp.cell(row=row, column=3, value=ci.get("bom_letter", ""))
-                ws_comp.cell(row=row, column=4, value=ci.get("bom_description", ""))
-                ws_comp.cell(row=row, column=5, value=ci.get("bom_quantity", ""))
-                ws_comp.cell(row=row, column=6, value=ci.get("bom_size", ""))
-                ws_comp.cell(row=row, column=7, value=ci.get("drawing_component", ""))
-                ws_comp.cell(row=row, column=8, value=ci.get("drawing_quantity", ""))
-                status = ci.get("match_status", "")
-                ws_comp.cell(row=row, column=9, value=status)
-                ws_comp.cell(row=row, column=10, value=ci.get("quantity_diff", ""))
-                ws_comp.cell(row=row, column=11, value=ci.get("notes", ""))
-                _style_data(ws_comp, row, len(hc))
-
-                fill = STATUS_FILL_MAP.get(status)
-                if fill:
-                    for c in range(1, len(hc) + 1):
-                        ws_comp.cell(row=row, column=c).fill = fill
-                row += 1
-
-        for i, w in enumerate([6, 16, 8, 35, 8, 8, 20, 10, 12, 6, 30], 1):
-            ws_comp.column_dimensions[get_column_letter(i)].width = w
-
-        # === Sheet 10: Comparison Summary (비교 요약) ===
-        ws_cs = wb.create_sheet("Comparison Summary")
-        hcs = ["Page", "Drawing No.", "Line No.", "BOM Items", "Comparable",
-               "Matched", "Mismatched", "BOM Only", "Drawing Only", "Match Rate (%)"]
-        for col, h in enumerate(hcs, 1):
-            ws_cs.cell(row=1, column=col, value=h)
-        _style_header(ws_cs, 1, len(hcs))
-
-        row = 2
-        tot_matched = tot_mismatched = tot_bom_only = tot_drawing_only = tot_comparable = 0
-        for page_data in vlm_data:
-            comparison = page_data.get("comparison", {})
-            if not comparison:
-                continue
-            summary = comparison.get("summary", {})
-            matched = summary.get("matched", 0)
-            mismatched = summary.get("mismatched", 0)
-            bom_only = summary.get("bom_only", 0)
-            drawing_only = summary.get("drawing_only", 0)
-            comparable = summary.get("comparable_items", 0)
-            tot_matched += matched
-            tot_mismatched += mismatched
-            tot_bom_only += bom_only
-            tot_drawing_only += drawing_only
-            tot_comparable += comparable
-
-            ws_cs.cell(row=row, column=1, value=comparison.get("page", 0))
-            ws_cs.cell(row=row, column=2, value=comparison.get("drawing_number", ""))
-            ws_cs.cell(row=row, column=3, value=comparison.get("line_no", ""))
-            ws_cs.cell(row=row, column=4, value=summary.get("total_bom_items", 0))
-            ws_cs.cell(row=row, column=5, value=comparable)
-            ws_cs.cell(row=row, column=6, value=matched)
-            ws_cs.cell(row=row, column=7, value=mismatched)
-            ws_cs.cell(row=row, column=8, value=bom_only)
-            ws_cs.cell(row=row, column=9, value=drawing_only)
-            ws_cs.cell(row=row, column=10, value=summary.get("match_rate", 0))
-            _style_data(ws_cs, row, len(hcs))
-
-            # 낮은 일치율 강조
-            if summary.get("match_rate", 100) < 50:
-                ws_cs.cell(row=row, column=10).fill = MISMATCH_FILL
-            row += 1
-
         # 합계 행
-        ws_cs.cell(row=row + 1, column=1, value="TOTAL")
-        ws_cs.cell(row=row + 1, column=5, value=tot_comparable)
-        ws_cs.cell(row=row + 1, column=6, value=tot_matched)
-        ws_cs.cell(row=row + 1, column=7, value=tot_mismatched)
-        ws_cs.cell(row=row + 1, column=8, value=tot_bom_only)
-        ws_cs.cell(row=row + 1, column=9, value=tot_drawing_only)
         overall_rate = round(tot_matched / max(1, tot_comparable) * 100, 1)
-        ws_cs.cell(row=row + 1, column=10, value=overall_rate)
-        _style_data(ws_cs, row + 1, len(hcs),
-                    font=Font(name="Arial", size=10, bold=True),
-                    fill=PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid"))
-
-        for i, w in enumerate([6, 16, 8, 10, 10, 10, 10, 10, 10, 12], 1):
-            ws_cs.column_dimensions[get_column_letter(i)].width = w
-
-    wb.save(output_path)
+        ws_cs.append([])
+        ws_cs.append(_data_cells(ws_cs, [
+            "TOTAL", None, None, None,
+            tot_comparable, tot_matched, tot_mismatched, tot_bom_only, tot_drawing_only,
+            overall_rate,
+        ], len(hcs), BOM_TOTAL_STYLE))
+
+    _save_workbook(wb, output_path)
     logger.info(f"VLM BOM Excel saved: {output_path} ({total_items} BOM items, "
                 f"{valve_count} valves, {fitting_count} fittings)")
     return output_path
@@ -871,122 +937,97 @@ def generate_vlm_bom_excel(vlm_data: list[dict], output_path: str) -> str:
 
 def generate_pid_analysis_excel(valves: list[dict], line_specs: list[dict],
                                  symbols_found: list[dict], output_path: str) -> str:
-    """P&ID VLM 분석 결과 Excel 생성 (3개 시트)"""
-    wb = openpyxl.Workbook()
+    """P&ID VLM 분석 결과 Excel 생성 (3개 시트, write-only 모드로 행 단위 스트리밍)"""
+    wb = openpyxl.Workbook(write_only=True)
+    _ensure_named_styles(wb)
 
     # === Sheet 1: Pipe & Valve List ===
-    ws1 = wb.active
-    ws1.title = "Pipe & Valve List"
+    ws1 = wb.create_sheet("Pipe & Valve List")
     h1 = ["No", "Tag", "Symbol Type", "Valve Type", "Actuator", "Size",
           "Line Spec", "Piping Class", "Schedule", "Pressure Rating",
           "Material", "Fluid", "Description", "Sheet", "Source"]
-    for col, h in enumerate(h1, 1):
-        ws1.cell(row=1, column=col, value=h)
-    _style_header(ws1, 1, len(h1))
+    _set_widths(ws1, [5, 12, 20, 12, 10, 6, 35, 10, 10, 12, 10, 6, 30, 6, 8])
+    ws1.append(_header_cells(ws1, h1))
 
-    row = 2
+    append1 = ws1.append
     for i, v in enumerate(valves, 1):
-        ws1.cell(row=row, column=1, value=i)
-        ws1.cell(row=row, column=2, value=v.get("tag", ""))
-        ws1.cell(row=row, column=3, value=v.get("valve_subtype", v.get("valve_type", "")))
-        ws1.cell(row=row, column=4, value=v.get("valve_type", ""))
-        ws1.cell(row=row, column=5, value=v.get("actuator", ""))
-        ws1.cell(row=row, column=6, value=v.get("size", ""))
-        ws1.cell(row=row, column=7, value=v.get("line_spec", ""))
-        ws1.cell(row=row, column=8, value=v.get("piping_class", ""))
-        ws1.cell(row=row, column=9, value=v.get("schedule", ""))
-        ws1.cell(row=row, column=10, value=v.get("pressure_rating", ""))
-        ws1.cell(row=row, column=11, value=v.get("material_code", ""))
-        ws1.cell(row=row, column=12, value=v.get("fluid", ""))
-        ws1.cell(row=row, column=13, value=v.get("description", ""))
-        ws1.cell(row=row, column=14, value=v.get("sheet", ""))
-        ws1.cell(row=row, column=15, value=v.get("source", ""))
-        _style_data(ws1, row, len(h1))
+        source = v.get("source", "")
+        cells = _data_cells(ws1, [
+            i,
+            v.get("tag", ""),
+            v.get("valve_subtype", v.get("valve_type", "")),
+            v.get("valve_type", ""),
+            v.get("actuator", ""),
+            v.get("size", ""),
+            v.get("line_spec", ""),
+            v.get("piping_class", ""),
+            v.get("schedule", ""),
+            v.get("pressure_rating", ""),
+            v.get("material_code", ""),
+            v.get("fluid", ""),
+            v.get("description", ""),
+            v.get("sheet", ""),
+            source,
+        ], len(h1))
 
         # VLM/Both 소스 강조
-        source = v.get("source", "")
         if source == "vlm":
-            ws1.cell(row=row, column=15).fill = ACCENT_FILL
+            cells[14].fill = ACCENT_FILL
         elif source == "both":
-            ws1.cell(row=row, column=15).fill = PatternFill(
-                start_color="DBEAFE", end_color="DBEAFE", fill_type="solid")
-        row += 1
-
-    for i, w in enumerate([5, 12, 20, 12, 10, 6, 35, 10, 10, 12, 10, 6, 30, 6, 8], 1):
-        ws1.column_dimensions[get_column_letter(i)].width = w
+            cells[14].fill = BOTH_SOURCE_FILL
+        append1(cells)
 
     # === Sheet 2: Line Specifications ===
     ws2 = wb.create_sheet("Line Specifications")
     h2 = ["No", "Full Spec", "Size", "System Code", "Line Number", "Tag",
           "Piping Class", "Schedule", "Pressure Rating", "Material", "Fluid", "Sheet"]
-    for col, h in enumerate(h2, 1):
-        ws2.cell(row=1, column=col, value=h)
-    _style_header(ws2, 1, len(h2))
+    _set_widths(ws2, [5, 35, 6, 12, 12, 12, 10, 10, 12, 10, 6, 6])
+    ws2.append(_header_cells(ws2, h2))
 
-    row = 2
+    append2 = ws2.append
     for i, ls in enumerate(line_specs, 1):
-        ws2.cell(row=row, column=1, value=i)
-        ws2.cell(row=row, column=2, value=ls.get("full_spec", ""))
-        ws2.cell(row=row, column=3, value=ls.get("size", ""))
-        ws2.cell(row=row, column=4, value=ls.get("system_code", ""))
-        ws2.cell(row=row, column=5, value=ls.get("line_number", ""))
-        ws2.cell(row=row, column=6, value=ls.get("tag", ""))
-        ws2.cell(row=row, column=7, value=ls.get("piping_class", ""))
-        ws2.cell(row=row, column=8, value=ls.get("schedule", ""))
-        ws2.cell(row=row, column=9, value=ls.get("pressure_rating", ""))
-        ws2.cell(row=row, column=10, value=ls.get("material_code", ""))
-        ws2.cell(row=row, column=11, value=ls.get("fluid", ""))
-        ws2.cell(row=row, column=12, value=ls.get("sheet", ""))
-        _style_data(ws2, row, len(h2))
-        row += 1
-
-    for i, w in enumerate([5, 35, 6, 12, 12, 12, 10, 10, 12, 10, 6, 6], 1):
-        ws2.column_dimensions[get_column_letter(i)].width = w
+        append2(_data_cells(ws2, [
+            i,
+            ls.get("full_spec", ""),
+            ls.get("size", ""),
+            ls.get("system_code", ""),
+            ls.get("line_number", ""),
+            ls.get("tag", ""),
+            ls.get("piping_class", ""),
+            ls.get("schedule", ""),
+            ls.get("pressure_rating", ""),
+            ls.get("material_code", ""),
+            ls.get("fluid", ""),
+            ls.get("sheet", ""),
+        ], len(h2)))
 
     # === Sheet 3: Summary ===
     ws3 = wb.create_sheet("Summary")
-    valve_by_type = defaultdict(int)
-    for v in valves:
-        vt = v.get("valve_type", "UNKNOWN")
-        valve_by_type[vt] += 1
-
-    system_count = defaultdict(int)
-    for ls in line_specs:
-        sc = ls.get("system_code", "UNKNOWN")
-        system_count[sc] += 1
+    valve_by_type = Counter(v.get("valve_type", "UNKNOWN") for v in valves)
+    system_count = Counter(ls.get("system_code", "UNKNOWN") for ls in line_specs)
 
     stats = [
-        ("P&ID ANALYSIS REPORT", ""),
-        ("", ""),
-        ("OVERVIEW", ""),
-        ("Total Line Specifications", len(line_specs)),
-        ("Total Valves", len(valves)),
-        ("Total Symbols Found", len(symbols_found)),
-        ("", ""),
-        ("VALVES BY TYPE", ""),
+        ("P&ID ANALYSIS REPORT", "", True),
+        ("", "", False),
+        ("OVERVIEW", "", True),
+        ("Total Line Specifications", len(line_specs), False),
+        ("Total Valves", len(valves), False),
+        ("Total Symbols Found", len(symbols_found), False),
+        ("", "", False),
+        ("VALVES BY TYPE", "", True),
     ]
     for vt, cnt in sorted(valve_by_type.items()):
-        stats.append((f"  {vt}", cnt))
+        stats.append((f"  {vt}", cnt, False))
     stats.extend([
-        ("", ""),
-        ("LINE SPECS BY SYSTEM", ""),
+        ("", "", False),
+        ("LINE SPECS BY SYSTEM", "", True),
     ])
     for sc, cnt in sorted(system_count.items()):
-        stats.append((f"  {sc}", cnt))
-
-    for r, (label, value) in enumerate(stats, 1):
-        ws3.cell(row=r, column=1, value=label)
-        ws3.cell(row=r, column=2, value=value)
-        if label and not value and label == label.upper():
-            ws3.cell(row=r, column=1).font = Font(name="Arial", size=11, bold=True)
-        else:
-            ws3.cell(row=r, column=1).font = Font(name="Arial", size=10)
-            ws3.cell(row=r, column=2).font = Font(name="Arial", size=10)
+        stats.append((f"  {sc}", cnt, False))
 
-    ws3.column_dimensions["A"].width = 35
-    ws3.column_dimensions["B"].width = 50
+    _write_stats(ws3, stats)
 
-    wb.save(output_path)
+    _save_workbook(wb, output_path)
     logger.info(f"P&ID analysis Excel saved: {output_path} "
                 f"({len(valves)} valves, {len(line_specs)} line specs)")
     return output_path
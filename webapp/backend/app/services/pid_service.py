@@ -3,15 +3,25 @@ import fitz  # PyMuPDF
 import re
 import json
 import logging
+from itertools import repeat
 from pathlib import Path
 
+from app.core.process_pool import new_process_pool, render_worker_count
+
 logger = logging.getLogger(__name__)
 
-# 밸브 태그 패턴
+MAX_RENDER_PAGES = 10  # render_pid_pages 최대 페이지 수
+
+# 밸브 태그 추출용 텍스트 플래그 - 기본 "text" 플래그에서 미지원 글리프 CID 치환만 제외
+# (TEXTFLAGS_SEARCH 는 줄끝 하이픈을 합쳐 라인 스펙이 달라질 수 있어 사용하지 않음)
+PID_TEXT_FLAGS = fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+
+# 밸브 태그 패턴 - 접두어 하나의 alternation (태그 전체만 사용하므로 캡처 그룹 없음)
 VALVE_TAG_PATTERN = re.compile(
-    r'(CSW|SSW|CFW|FW)\d{4}[A-Z]?'  # Manual valves
-    r'|'
-    r'(FCV|TCV|XV|LCV|PCV)\d{4}[A-Z]?'  # Control valves
+    r'(?:CSW|SSW|CFW|FW'  # Manual valves
+    r'|FCV|TCV|XV|LCV|PCV)'  # Control valves
+    r'\d{4}[A-Z]?',
+    re.ASCII,
 )
 
 # 라인 스펙 패턴: SIZE"-SERVICE-LINE#-CLASS-SCHEDULE 등
@@ -36,31 +46,64 @@ VALVE_TYPE_KEYWORDS = {
     "PCV": "CONTROL",
 }
 
+# 태그 접두어별 유체 / 위치 / 컨트롤 밸브 상세 타입
+FLUID_BY_PREFIX = {
+    "SSW": "SW",
+    "CSW": "SW",
+    "CFW": "CFW",
+    "FW": "FW",
+    "FCV": "SW",
+    "TCV": "SW",
+    "XV": "SW",
+}
 
-def extract_valves(pdf_path: str) -> list[dict]:
-    """P&ID PDF에서 밸브 목록 추출"""
-    doc = fitz.open(pdf_path)
+LOCATION_BY_PREFIX = {
+    "SSW": "SPRAY SEA WATER SYSTEM",
+    "CSW": "COOLING SEA WATER SYSTEM",
+    "CFW": "COOLING FRESH WATER SYSTEM",
+    "FW": "FRESH WATER SYSTEM",
+}
+
+CONTROL_SUBTYPE_BY_PREFIX = {
+    "FCV": "FLOW CONTROL VALVE",
+    "TCV": "TEMPERATURE CONTROL VALVE",
+    "XV": "SHUTOFF VALVE",
+    "LCV": "LEVEL CONTROL VALVE",
+    "PCV": "PRESSURE CONTROL VALVE",
+}
+
+
+def _open_pdf(pdf: "str | fitz.Document") -> tuple[fitz.Document, bool]:
+    """경로면 새로 열고, 이미 열린 문서면 그대로 사용 → (doc, 직접 열었는지)"""
+    if isinstance(pdf, fitz.Document):
+        return pdf, False
+    return fitz.open(pdf), True
+
+
+def extract_valves(pdf_path: "str | fitz.Document") -> list[dict]:
+    """P&ID PDF에서 밸브 목록 추출 (열린 fitz.Document 를 넘기면 다시 열지 않음)"""
+    doc, owned = _open_pdf(pdf_path)
     valves = []
     seen_tags = set()
+    seen_add = seen_tags.add
 
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        text = page.get_text("text")
-        blocks = page.get_text("blocks")
+    for page_num, page in enumerate(doc):
+        text = page.get_text("text", flags=PID_TEXT_FLAGS)
 
         # 밸브 태그 찾기
         for match in VALVE_TAG_PATTERN.finditer(text):
             tag = match.group()
             if tag in seen_tags:
                 continue
-            seen_tags.add(tag)
+            seen_add(tag)
 
-            # 태그 주변 텍스트에서 정보 추출
+            # 태그 주변 텍스트에서 정보 추출 (접두어는 한 번만 잘라 각 판별 함수에 전달)
             context = _get_context(text, match.start(), window=500)
+            prefix3, prefix2 = tag[:3], tag[:2]
 
             valve = {
                 "tag": tag,
-                "valve_type": _detect_valve_type(tag, context),
+                "valve_type": _detect_valve_type(prefix3, context),
                 "valve_subtype": "",
                 "line_spec": "",
                 "size": "",
@@ -68,9 +111,9 @@ def extract_valves(pdf_path: str) -> list[dict]:
                 "schedule": "STD",
                 "pressure_rating": "150",
                 "material_code": "",
-                "location": _detect_location(tag),
+                "location": _detect_location(prefix3, prefix2),
                 "description": "",
-                "fluid": _detect_fluid(tag),
+                "fluid": _detect_fluid(prefix3, prefix2),
                 "sheet": page_num + 1,
             }
 
@@ -94,7 +137,7 @@ def extract_valves(pdf_path: str) -> list[dict]:
                 valve["valve_subtype"] = "CHECK VALVE"
                 valve["description"] = f"{valve['size']}\" CHECK VALVE"
             elif vtype == "CONTROL":
-                valve["valve_subtype"] = _detect_control_subtype(tag, context)
+                valve["valve_subtype"] = _detect_control_subtype(prefix3, prefix2)
                 valve["description"] = f"{valve['size']}\" CONTROL VALVE ({valve['valve_subtype']})"
             else:
                 valve["valve_subtype"] = f"{vtype} VALVE"
@@ -102,8 +145,9 @@ def extract_valves(pdf_path: str) -> list[dict]:
 
             valves.append(valve)
 
-    doc.close()
-    logger.info(f"Extracted {len(valves)} valves from {pdf_path}")
+    if owned:
+        doc.close()
+    logger.info(f"Extracted {len(valves)} valves from {doc.name}")
     return valves
 
 
@@ -113,8 +157,8 @@ def _get_context(text: str, pos: int, window: int = 500) -> str:
     return text[start:end]
 
 
-def _detect_valve_type(tag: str, context: str) -> str:
-    prefix = tag[:3] if len(tag) >= 3 else tag[:2]
+def _detect_valve_type(prefix: str, context: str) -> str:
+    """prefix: 태그 앞 3글자 (tag[:3])"""
     if prefix in ("FCV", "TCV", "LCV", "PCV"):
         return "CONTROL"
     if prefix == "XV":
@@ -128,56 +172,58 @@ def _detect_valve_type(tag: str, context: str) -> str:
     return "BUTTERFLY"  # default
 
 
-def _detect_fluid(tag: str) -> str:
-    if tag.startswith("SSW"):
-        return "SW"
-    if tag.startswith("CSW"):
-        return "SW"
-    if tag.startswith("CFW"):
-        return "CFW"
-    if tag.startswith("FW"):
-        return "FW"
-    if tag.startswith("FCV") or tag.startswith("TCV") or tag.startswith("XV"):
-        return "SW"
-    return "SW"
-
-
-def _detect_location(tag: str) -> str:
-    if tag.startswith("SSW"):
-        return "SPRAY SEA WATER SYSTEM"
-    if tag.startswith("CSW"):
-        return "COOLING SEA WATER SYSTEM"
-    if tag.startswith("CFW"):
-        return "COOLING FRESH WATER SYSTEM"
-    if tag.startswith("FW"):
-        return "FRESH WATER SYSTEM"
-    return "GENERAL"
-
-
-def _detect_control_subtype(tag: str, context: str) -> str:
-    if tag.startswith("FCV"):
-        return "FLOW CONTROL VALVE"
-    if tag.startswith("TCV"):
-        return "TEMPERATURE CONTROL VALVE"
-    if tag.startswith("XV"):
-        return "SHUTOFF VALVE"
-    if tag.startswith("LCV"):
-        return "LEVEL CONTROL VALVE"
-    if tag.startswith("PCV"):
-        return "PRESSURE CONTROL VALVE"
-    return "CONTROL VALVE"
-
-
-def render_pid_pages(pdf_path: str, output_dir: str, dpi: int = 200) -> list[str]:
-    """P&ID PDF 페이지를 이미지로 렌더링"""
+def _prefix_lookup(table: dict, prefix3: str, prefix2: str, default: str) -> str:
+    """태그 접두어 (3글자 → 2글자 순) 로 table 조회"""
+    return table.get(prefix3) or table.get(prefix2, default)
+
+
+def _detect_fluid(prefix3: str, prefix2: str) -> str:
+    return _prefix_lookup(FLUID_BY_PREFIX, prefix3, prefix2, "SW")
+
+
+def _detect_location(prefix3: str, prefix2: str) -> str:
+    return _prefix_lookup(LOCATION_BY_PREFIX, prefix3, prefix2, "GENERAL")
+
+
+def _detect_control_subtype(prefix3: str, prefix2: str) -> str:
+    return _prefix_lookup(CONTROL_SUBTYPE_BY_PREFIX, prefix3, prefix2, "CONTROL VALVE")
+
+
+def _write_page_png(page: fitz.Page, output_dir: str, dpi: int) -> str:
+    mat = fitz.Matrix(dpi / 72, dpi / 72)
+    pix = page.get_pixmap(matrix=mat, alpha=False)
+    out_path = Path(output_dir) / f"pid_page{page.number+1}.png"
+    out_path.write_bytes(pix.tobytes("png"))  # 메모리에서 PNG 인코딩 후 1회 기록
+    return str(out_path)
+
+
+def _render_pid_page(pdf_path: str, page_index: int, output_dir: str, dpi: int) -> str:
+    """P&ID 1페이지 렌더링 (프로세스 풀 워커 - 페이지마다 문서를 따로 염)"""
     doc = fitz.open(pdf_path)
-    results = []
-    for i in range(min(len(doc), 10)):  # 최대 10페이지
-        page = doc[i]
-        mat = fitz.Matrix(dpi / 72, dpi / 72)
-        pix = page.get_pixmap(matrix=mat)
-        out_path = Path(output_dir) / f"pid_page{i+1}.png"
-        pix.save(str(out_path))
-        results.append(str(out_path))
-    doc.close()
-    return results
+    try:
+        return _write_page_png(doc[page_index], output_dir, dpi)
+    finally:
+        doc.close()
+
+
+def render_pid_pages(pdf_path: "str | fitz.Document", output_dir: str, dpi: int = 200) -> list[str]:
+    """P&ID PDF 페이지를 이미지로 렌더링 (페이지별 프로세스 병렬)
+
+    열린 fitz.Document 를 넘기면 단일 프로세스 경로에서 그대로 렌더링하고,
+    프로세스 풀 워커는 doc.name 경로로 각자 문서를 연다
+    """
+    doc, owned = _open_pdf(pdf_path)
+    try:
+        page_count = min(len(doc), MAX_RENDER_PAGES)
+        workers = render_worker_count(page_count)
+        if workers <= 1 or not doc.name:
+            return [_write_page_png(doc[i], output_dir, dpi) for i in range(page_count)]
+        path = doc.name
+    finally:
+        if owned:
+            doc.close()
+
+    with new_process_pool(workers) as ex:
+        # map 은 입력 순서대로 결과를 돌려주므로 페이지 순서 유지
+        return list(ex.map(_render_pid_page, repeat(path), range(page_count),
+                           repeat(output_dir), repeat(dpi)))
@@ -4,16 +4,16 @@ Claude Vision을 사용하여 P&ID 2-3페이지(pump room 도면)에서
 valve, pipe 심볼을 식별하고 라인스펙 태그를 추출합니다.
 1페이지 레전드 심볼 라이브러리를 참조로 사용합니다.
 """
-import anthropic
 import base64
 import fitz  # PyMuPDF
 import json
 import logging
 import re
 import time
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 from app.core.config import ANTHROPIC_API_KEY
+from app.core.llm_client import get_anthropic_client
 from app.services.symbol_db_service import get_symbol_reference_text
 
 logger = logging.getLogger(__name__)
@@ -29,6 +29,12 @@ LINE_SPEC_FULL = re.compile(
     r'[-–]?\s*([A-Z]{1,3})?'       # MATERIAL CODE (NI, etc.)
 )
 
+PID_VLM_MAX_WORKERS = 4  # 동시 VLM 호출 수 상한
+VLM_JPEG_QUALITY = 85  # VLM 전송용 JPEG 품질 (PNG deflate 대비 인코딩/전송 모두 가벼움)
+# VLM 렌더 긴 변 목표 픽셀 - Claude Vision 은 긴 변 ~1568px 로 내부 축소하므로 그 이상은 전송량/토큰 낭비
+PID_VLM_MAX_PX = 2000
+PID_VLM_DPI_RANGE = (100, 200)  # (최소, 최대) DPI
+
 # 시스템 코드별 유체 매핑
 SYSTEM_FLUID_MAP = {
     "CSW": "SW",   # Cooling Sea Water
@@ -40,8 +46,10 @@ SYSTEM_FLUID_MAP = {
 # ──────────────────────────────────────────────
 # VLM 프롬프트
 # ──────────────────────────────────────────────
-PID_PAGE_ANALYSIS_PROMPT = """You are an expert P&ID (Piping and Instrumentation Diagram) engineer.
-You are analyzing page {page_num} of a P&ID drawing for a ship's pump room piping system.
+# 페이지 공통 지시문 + 심볼 라이브러리 → system 프롬프트 (모든 페이지에 같은 바이트로 보내 prompt cache 적중)
+# 페이지 번호는 user 메시지(PID_PAGE_USER_PROMPT)에만 넣음
+PID_SYSTEM_PROMPT = """You are an expert P&ID (Piping and Instrumentation Diagram) engineer.
+You are analyzing pages of a P&ID drawing for a ship's pump room piping system.
 
 ## REFERENCE SYMBOL LIBRARY (from the legend page):
 {symbol_reference}
@@ -90,9 +98,9 @@ Identify piping symbols like:
 ### 4. EQUIPMENT
 List major equipment visible (pumps, heat exchangers, tanks, sea chests, etc.)
 
-Return ONLY valid JSON:
+Return ONLY valid JSON (use the page number given in the request):
 {{
-  "page": {page_num},
+  "page": <page number from the request>,
   "line_specs": [
     {{
       "full_spec": "10\\"-CSW-9103-CS3-40#150-NI",
@@ -149,35 +157,44 @@ CRITICAL RULES:
 4. Read ALL text annotations, especially those near valves and pipe lines
 5. Return ONLY valid JSON, no markdown"""
 
+PID_PAGE_USER_PROMPT = "Analyze page {page_num} of the P&ID drawing shown in the image."
+
 
-def _encode_image(image_path: str) -> str:
-    with open(image_path, "rb") as f:
-        return base64.standard_b64encode(f.read()).decode("utf-8")
+def _build_pid_system(symbol_ref_text: str) -> list[dict]:
+    """페이지 공통 system 블록 - 마지막 블록에 cache_control 을 붙여 지시문 + 심볼 라이브러리 전체를 캐시"""
+    return [{
+        "type": "text",
+        "text": PID_SYSTEM_PROMPT.format(symbol_reference=symbol_ref_text),
+        "cache_control": {"type": "ephemeral"},
+    }]
 
 
-def _call_vlm(image_path: str, prompt: str, max_tokens: int = 8192) -> str:
+def _call_vlm(img_bytes: bytes, prompt: str, max_tokens: int = 8192,
+              system: list[dict] | None = None) -> str:
     if not ANTHROPIC_API_KEY:
         raise ValueError("ANTHROPIC_API_KEY not configured")
 
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-    img_data = _encode_image(image_path)
+    client = get_anthropic_client()
+    img_data = base64.standard_b64encode(img_bytes).decode("utf-8")
 
     content = [
         {
             "type": "image",
             "source": {
                 "type": "base64",
-                "media_type": "image/png",
+                "media_type": "image/jpeg",
                 "data": img_data,
             },
         },
         {"type": "text", "text": prompt},
     ]
 
+    kwargs = {"system": system} if system else {}
     resp = client.messages.create(
         model="claude-sonnet-4-5-20250929",
         max_tokens=max_tokens,
         messages=[{"role": "user", "content": content}],
+        **kwargs,
     )
     return resp.content[0].text
 
@@ -201,27 +218,27 @@ def _parse_json_response(text: str) -> dict:
         return {}
 
 
-def _render_pid_page_for_vlm(pdf_path: str, page_idx: int,
-                              output_dir: str, max_px: int = 6000) -> str:
-    """P&ID 페이지를 VLM 분석용으로 고해상도 렌더링."""
-    doc = fitz.open(pdf_path)
-    page = doc[page_idx]
+def _render_pid_page_for_vlm(page: fitz.Page, max_px: int = PID_VLM_MAX_PX) -> bytes:
+    """P&ID 페이지를 VLM 분석용으로 렌더링 (디스크 저장 없이 JPEG 바이트 반환).
+
+    긴 변이 max_px 가 되도록 DPI 를 정하되 PID_VLM_DPI_RANGE 로 제한.
+    max_px 를 낮추면 업로드/이미지 토큰이 면적에 비례해 줄고, 대신 작은 태그 글자 판독률이 떨어질 수 있음.
+    """
     pw, ph = page.rect.width, page.rect.height
 
     max_dim = max(pw, ph)
-    dpi = min(250, int(max_px / max_dim * 72))
-    dpi = max(dpi, 150)
+    min_dpi, max_dpi = PID_VLM_DPI_RANGE
+    dpi = max(min(max_dpi, int(max_px / max_dim * 72)), min_dpi)
 
     mat = fitz.Matrix(dpi / 72, dpi / 72)
-    pix = page.get_pixmap(matrix=mat)
+    pix = page.get_pixmap(matrix=mat, alpha=False)
 
-    img_path = str(Path(output_dir) / f"pid_vlm_page_{page_idx + 1}.png")
-    pix.save(img_path)
-    logger.info(f"P&ID page {page_idx + 1} rendered: {pix.width}x{pix.height}px at {dpi}dpi")
+    img_bytes = pix.tobytes("jpeg", jpg_quality=VLM_JPEG_QUALITY)
+    logger.info(f"P&ID page {page.number + 1} rendered: {pix.width}x{pix.height}px at {dpi}dpi "
+                f"({len(img_bytes) // 1024}KB jpeg)")
 
     pix = None
-    doc.close()
-    return img_path
+    return img_bytes
 
 
 def _parse_line_spec(full_spec: str) -> dict:
@@ -251,12 +268,9 @@ def _parse_line_spec(full_spec: str) -> dict:
     }
 
 
-def _extract_line_specs_from_text(pdf_path: str, page_idx: int) -> list[dict]:
+def _extract_line_specs_from_text(page: fitz.Page) -> list[dict]:
     """PDF 페이지 텍스트에서 라인스펙 추출 (regex 기반 보조)."""
-    doc = fitz.open(pdf_path)
-    page = doc[page_idx]
     text = page.get_text("text")
-    doc.close()
 
     results = []
     seen_specs = set()
@@ -272,22 +286,18 @@ def _extract_line_specs_from_text(pdf_path: str, page_idx: int) -> list[dict]:
     return results
 
 
-def _analyze_single_pid_page(pdf_path: str, page_idx: int,
-                              output_dir: str, symbol_ref_text: str) -> dict:
-    """단일 P&ID 페이지 VLM 분석."""
-    page_num = page_idx + 1
+def _analyze_single_pid_page(page_num: int, img_bytes: bytes, text_specs: list[dict],
+                             system: list[dict]) -> dict:
+    """단일 P&ID 페이지 VLM 분석.
 
-    # 1. 렌더링
-    img_path = _render_pid_page_for_vlm(pdf_path, page_idx, output_dir)
-
-    # 2. VLM 분석
-    prompt = PID_PAGE_ANALYSIS_PROMPT.format(
-        page_num=page_num,
-        symbol_reference=symbol_ref_text,
-    )
+    img_bytes/text_specs 는 호출 측에서 열어 둔 문서로 미리 준비 (fitz.Document 는 스레드 간 공유 불가)
+    system: _build_pid_system 결과, 페이지 간 공유
+    """
+    # 1. VLM 분석
+    prompt = PID_PAGE_USER_PROMPT.format(page_num=page_num)
 
     try:
-        resp_text = _call_vlm(img_path, prompt, max_tokens=8192)
+        resp_text = _call_vlm(img_bytes, prompt, max_tokens=8192, system=system)
         vlm_data = _parse_json_response(resp_text)
         if not vlm_data:
             logger.warning(f"P&ID page {page_num}: VLM returned empty data")
@@ -299,8 +309,7 @@ def _analyze_single_pid_page(pdf_path: str, page_idx: int,
 
     vlm_data["page"] = page_num
 
-    # 3. 텍스트 추출로 보완
-    text_specs = _extract_line_specs_from_text(pdf_path, page_idx)
+    # 2. 텍스트 추출로 보완
     vlm_specs = vlm_data.get("line_specs", [])
 
     # VLM line_specs 파싱 보정
@@ -320,7 +329,7 @@ def _analyze_single_pid_page(pdf_path: str, page_idx: int,
 
     vlm_data["line_specs"] = vlm_specs
 
-    # 4. 밸브 후처리: tag 생성 보정
+    # 3. 밸브 후처리: tag 생성 보정
     for valve in vlm_data.get("valves", []):
         tag = valve.get("tag", "")
         if not tag and valve.get("line_spec"):
@@ -338,31 +347,34 @@ def _analyze_single_pid_page(pdf_path: str, page_idx: int,
 
 def analyze_pid_pages(pdf_path: str, output_dir: str,
                       symbols: list[dict],
-                      pages: list[int] | None = None) -> dict:
+                      pages: list[int] | None = None,
+                      max_px: int = PID_VLM_MAX_PX) -> dict:
     """P&ID PDF의 지정 페이지들을 VLM으로 분석.
 
     Args:
         pdf_path: P&ID PDF 경로
-        output_dir: 출력 디렉토리
+        output_dir: 출력 디렉토리 (VLM 이미지는 메모리에서 바로 전송하므로 현재 미사용, 호환용)
         symbols: 레전드에서 추출한 심볼 리스트
         pages: 분석할 페이지 인덱스 (0-based). None이면 1,2 (2-3페이지)
+        max_px: VLM 렌더 이미지 긴 변 목표 픽셀 (_render_pid_page_for_vlm 참고)
 
     Returns:
         통합 분석 결과 dict
     """
     doc = fitz.open(pdf_path)
     total_pages = len(doc)
-    doc.close()
 
     if pages is None:
         # 기본값: 2-3페이지 (0-indexed: 1, 2)
         pages = [i for i in [1, 2] if i < total_pages]
 
     if not pages:
+        doc.close()
         logger.warning("No P&ID pages to analyze")
         return {"pages_analyzed": [], "line_specs": [], "valves": [], "symbols_found": []}
 
     symbol_ref_text = get_symbol_reference_text(symbols) if symbols else ""
+    system = _build_pid_system(symbol_ref_text)
 
     all_line_specs = []
     all_valves = []
@@ -374,11 +386,27 @@ def analyze_pid_pages(pdf_path: str, output_dir: str,
 
     logger.info(f"Starting P&ID VLM analysis: pages {[p+1 for p in pages]}")
 
-    for page_idx in pages:
+    def _timed_analyze(page_num: int, img_bytes: bytes, text_specs: list[dict]) -> tuple[dict, float]:
         page_start = time.time()
-
-        page_result = _analyze_single_pid_page(
-            pdf_path, page_idx, output_dir, symbol_ref_text)
+        page_result = _analyze_single_pid_page(page_num, img_bytes, text_specs, system)
+        return page_result, time.time() - page_start
+
+    # 페이지별 VLM 호출은 네트워크 대기 위주 → 스레드로 동시 실행 (429 는 클라이언트 재시도에 맡김)
+    # 렌더링/텍스트 추출은 한 번 연 문서로 메인 스레드에서 하고, 각 페이지는 준비되는 즉시 제출
+    # 결과는 페이지 순서대로 모으므로 병합/중복 제거 결과는 순차 처리와 동일
+    with ThreadPoolExecutor(max_workers=min(len(pages), PID_VLM_MAX_WORKERS)) as ex:
+        try:
+            futures = []
+            for page_idx in pages:
+                page = doc[page_idx]
+                futures.append(ex.submit(_timed_analyze, page_idx + 1,
+                                         _render_pid_page_for_vlm(page, max_px),
+                                         _extract_line_specs_from_text(page)))
+        finally:
+            doc.close()
+        timed_results = [f.result() for f in futures]
+
+    for page_idx, (page_result, elapsed) in zip(pages, timed_results):
         page_results.append(page_result)
 
         # 라인스펙 병합 (중복 제거)
@@ -407,14 +435,9 @@ def analyze_pid_pages(pdf_path: str, output_dir: str,
             eq["sheet"] = page_idx + 1
             all_equipment.append(eq)
 
-        elapsed = time.time() - page_start
         logger.info(f"  Page {page_idx + 1}: {len(page_result.get('line_specs', []))} line specs, "
                      f"{len(page_result.get('valves', []))} valves ({elapsed:.1f}s)")
 
-        # Rate limiting
-        if page_idx != pages[-1]:
-            time.sleep(0.5)
-
     result = {
         "pages_analyzed": [p + 1 for p in pages],
         "line_specs": all_line_specs,
@@ -437,12 +460,28 @@ def merge_regex_and_vlm(regex_valves: list[dict], vlm_result: dict) -> list[dict
     """
     vlm_valves = vlm_result.get("valves", [])
     vlm_tags = {v.get("tag", "") for v in vlm_valves}
+    regex_map = {rv["tag"]: rv for rv in regex_valves if rv.get("tag")}
+
+    # 라인스펙 태그 → 스펙 (같은 태그가 여러 번이면 첫 번째 우선)
+    ls_by_tag = {}
+    for ls in vlm_result.get("line_specs", []):
+        ls_tag = ls.get("tag", "")
+        if ls_tag:
+            ls_by_tag.setdefault(ls_tag, ls)
 
     enhanced = []
 
-    # VLM 밸브가 기본
+    # VLM 밸브가 기본 (regex 에도 있는 밸브는 VLM 에 없는 필드만 regex 에서 보완)
     for vv in vlm_valves:
-        vv["source"] = "vlm"
+        rv = regex_map.get(vv.get("tag", ""))
+        if rv is None:
+            vv["source"] = "vlm"
+        else:
+            vv["source"] = "both"
+            if not vv.get("location"):
+                vv["location"] = rv.get("location", "")
+            if not vv.get("fluid"):
+                vv["fluid"] = rv.get("fluid", "")
         enhanced.append(vv)
 
     # regex에서만 발견된 밸브 추가
@@ -451,29 +490,13 @@ def merge_regex_and_vlm(regex_valves: list[dict], vlm_result: dict) -> list[dict
         if tag and tag not in vlm_tags:
             rv["source"] = "regex"
             # VLM line_specs에서 매칭되는 라인스펙 찾기
-            for ls in vlm_result.get("line_specs", []):
-                ls_tag = ls.get("tag", "")
-                if ls_tag and tag.startswith(ls_tag[:3]) and tag[3:] == ls_tag[3:]:
-                    rv["line_spec"] = ls.get("full_spec", "")
-                    rv["piping_class"] = ls.get("piping_class", rv.get("piping_class", ""))
-                    rv["schedule"] = ls.get("schedule", rv.get("schedule", ""))
-                    rv["pressure_rating"] = ls.get("pressure_rating", "")
-                    rv["material_code"] = ls.get("material_code", "")
-                    break
+            ls = ls_by_tag.get(tag)
+            if ls is not None:
+                rv["line_spec"] = ls.get("full_spec", "")
+                rv["piping_class"] = ls.get("piping_class", rv.get("piping_class", ""))
+                rv["schedule"] = ls.get("schedule", rv.get("schedule", ""))
+                rv["pressure_rating"] = ls.get("pressure_rating", "")
+                rv["material_code"] = ls.get("material_code", "")
             enhanced.append(rv)
 
-    # VLM과 regex 양쪽에 있는 밸브: VLM 데이터에 regex 정보 보완
-    regex_map = {rv["tag"]: rv for rv in regex_valves if rv.get("tag")}
-    for ev in enhanced:
-        if ev.get("source") == "vlm":
-            tag = ev.get("tag", "")
-            if tag in regex_map:
-                ev["source"] = "both"
-                rv = regex_map[tag]
-                # VLM에 없는 필드만 regex에서 보완
-                if not ev.get("location"):
-                    ev["location"] = rv.get("location", "")
-                if not ev.get("fluid"):
-                    ev["fluid"] = rv.get("fluid", "")
-
     return sorted(enhanced, key=lambda v: v.get("tag", ""))
@@ -1,16 +1,24 @@
 """PIPE BOM PDF에서 데이터 추출 서비스"""
 import fitz  # PyMuPDF
+import hashlib
+import os
 import re
 import json
 import logging
+import shutil
+from itertools import repeat
 from pathlib import Path
+from app.core.config import RENDER_CACHE_DIR, RENDER_CACHE_MAX_MB
+from app.core.process_pool import new_process_pool, render_worker_count
 
 logger = logging.getLogger(__name__)
 
 # 파이프 피스 패턴
 PIPE_PIECE_PATTERN = re.compile(r'[A-Z]{1,3}\d{3,5}(?:-\d+)?(?:[A-Z])?')
+# 패턴 자체가 숫자 3자리 이상(길이 4 이상)을 보장하므로 접두어만 걸러냄
+PIPE_PIECE_EXCLUDE_PREFIXES = ("REV", "DWG", "ISO", "PAGE")
 WELD_PATTERN = re.compile(r'(?:FFW|W)\d+')
-DIMENSION_PATTERN = re.compile(r'(\d{2,5})\s*(?:mm)?')
+DIMENSION_PATTERN = re.compile(r'\d{2,5}')  # 뒤따르는 " mm" 단위는 매칭 결과에 영향 없음
 REVISION_PATTERN = re.compile(r'REV[.\s]*([A-Z0-9]+)', re.IGNORECASE)
 
 # 표지 페이지 감지용 키워드
@@ -19,12 +27,13 @@ COVER_KEYWORDS = ["INDEX", "TABLE OF CONTENTS", "목차", "COVER", "DRAWING LIST
 
 def _is_cover_page(text: str) -> bool:
     """표지/목차 페이지 여부 판단"""
-    text_upper = text.upper()
     # 파이프 피스가 하나도 없고, 표지 키워드가 있으면 표지
-    pieces = PIPE_PIECE_PATTERN.findall(text)
-    valid_pieces = [p for p in pieces if len(p) >= 4 and any(c.isdigit() for c in p)
-                    and not p.startswith(("REV", "DWG", "ISO", "PAGE"))]
-    if not valid_pieces:
+    # finditer 로 첫 유효 피스에서 바로 멈춤 → 일반 도면 페이지는 텍스트 앞부분만 스캔
+    has_piece = any(not m.group().startswith(PIPE_PIECE_EXCLUDE_PREFIXES)
+                    for m in PIPE_PIECE_PATTERN.finditer(text))
+    if not has_piece:
+        # 대문자 사본은 키워드 검사가 필요할 때만 생성
+        text_upper = text.upper()
         for kw in COVER_KEYWORDS:
             if kw in text_upper:
                 return True
@@ -41,8 +50,9 @@ def extract_pipe_bom(pdf_path: str) -> list[dict]:
 
     for page_num in range(total_pages):
         page = doc[page_num]
-        text = page.get_text("text")
-        blocks = page.get_text("blocks")
+        # text/blocks 를 같은 TextPage 에서 뽑아 페이지 텍스트 해석은 1회만
+        textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)  # get_text 기본 플래그와 동일
+        text = page.get_text("text", textpage=textpage)
 
         # 표지 페이지 스킵 (데이터는 기록하되 is_cover 플래그)
         is_cover = _is_cover_page(text) if page_num == 0 else False
@@ -65,14 +75,15 @@ def extract_pipe_bom(pdf_path: str) -> list[dict]:
             pages_data.append(page_data)
             continue
 
-        # 파이프 피스 추출
-        pieces = PIPE_PIECE_PATTERN.findall(text)
-        valid_pieces = []
-        for p in pieces:
-            if len(p) >= 4 and any(c.isdigit() for c in p):
-                if not p.startswith(("REV", "DWG", "ISO", "PAGE")):
-                    valid_pieces.append(p)
-        page_data["pipe_pieces"] = list(dict.fromkeys(valid_pieces))
+        # 파이프 피스 추출 (처음 본 문자열만 검사 → 중복 제거와 순서 유지를 한 번에)
+        seen_pieces = set()
+        valid_pieces = page_data["pipe_pieces"]
+        for p in PIPE_PIECE_PATTERN.findall(text):
+            if p in seen_pieces:
+                continue
+            seen_pieces.add(p)
+            if not p.startswith(PIPE_PIECE_EXCLUDE_PREFIXES):
+                valid_pieces.append(p)
 
         # 용접 항목 추출
         welds = WELD_PATTERN.findall(text)
@@ -80,10 +91,8 @@ def extract_pipe_bom(pdf_path: str) -> list[dict]:
         page_data["weld_count"] = len(welds)
 
         # 치수 추출 (100~30000mm 범위)
-        for dim_match in DIMENSION_PATTERN.finditer(text):
-            val = int(dim_match.group(1))
-            if 100 <= val <= 30000:
-                page_data["dimensions_mm"].append(val)
+        page_data["dimensions_mm"] = [val for val in map(int, DIMENSION_PATTERN.findall(text))
+                                      if 100 <= val <= 30000]
 
         # LOOSE 파트 감지
         if "LOOSE" in text.upper():
@@ -93,12 +102,15 @@ def extract_pipe_bom(pdf_path: str) -> list[dict]:
         for rev_match in REVISION_PATTERN.finditer(text):
             page_data["revision_notes"].append(f"REV.{rev_match.group(1)}")
 
-        # 블록 텍스트 수집
-        for block in blocks:
+        # 블록 텍스트 수집 (strip 전 길이로 짧은 블록을 먼저 거름)
+        table_text = page_data["table_text"]
+        for block in page.get_text("blocks", textpage=textpage):
             if len(block) >= 5:
-                block_text = block[4].strip() if isinstance(block[4], str) else ""
-                if block_text and len(block_text) > 2:
-                    page_data["table_text"].append(block_text)
+                raw = block[4]
+                if isinstance(raw, str) and len(raw) > 2:
+                    block_text = raw.strip()
+                    if len(block_text) > 2:
+                        table_text.append(block_text)
 
         pages_data.append(page_data)
 
@@ -111,40 +123,133 @@ def extract_pipe_bom(pdf_path: str) -> list[dict]:
     return pages_data
 
 
+def _pdf_digest(pdf_path: str) -> str:
+    """PDF 내용 해시 (렌더 캐시 키)"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(pdf_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _write_bom_page_png(page: fitz.Page, out_path: str, dpi: int) -> str:
+    mat = fitz.Matrix(dpi / 72, dpi / 72)
+    pix = page.get_pixmap(matrix=mat)
+    # 임시 파일에 쓰고 교체 → 같은 PDF 를 동시에 처리하는 세션이 반쯤 쓴 캐시를 읽지 않음
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    pix.save(tmp_path, output="png")
+    os.replace(tmp_path, out_path)
+    pix = None  # 메모리 해제
+    return out_path
+
+
+def _render_bom_page(pdf_path: str, page_index: int, out_path: str, dpi: int) -> str:
+    """BOM 1페이지 렌더링 (프로세스 풀 워커 - 페이지마다 문서를 따로 염)"""
+    doc = fitz.open(pdf_path)
+    try:
+        return _write_bom_page_png(doc[page_index], out_path, dpi)
+    finally:
+        doc.close()
+
+
+def _evict_render_cache(in_use: set[str]):
+    """렌더 캐시 합계가 RENDER_CACHE_MAX_MB 를 넘으면 오래 안 쓴(mtime) PNG 부터 삭제
+
+    in_use: 방금 사용한 캐시 파일 (삭제 제외)
+    세션 폴더의 하드링크는 그대로 남으므로 세션 이미지에는 영향 없음
+    """
+    entries = []
+    total = 0
+    for path in RENDER_CACHE_DIR.glob("*.png"):
+        try:
+            st = path.stat()
+        except FileNotFoundError:  # 다른 세션이 먼저 삭제
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+
+    limit = RENDER_CACHE_MAX_MB * 1024 * 1024
+    if total <= limit:
+        return
+
+    entries.sort()
+    removed = 0
+    for _, size, path in entries:
+        if total <= limit:
+            break
+        if str(path) in in_use:
+            continue
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    logger.info(f"Render cache evicted {removed} files ({total / 1024 / 1024:.0f}MB left)")
+
+
+def _link_or_copy(src: str, dst: Path):
+    """캐시 렌더를 세션 폴더로 (가능하면 하드링크, 아니면 복사)"""
+    dst.unlink(missing_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
 def render_bom_pages(pdf_path: str, output_dir: str, dpi: int = 0, max_pages: int = 0) -> list[str]:
-    """PIPE BOM PDF 페이지를 이미지로 렌더링 (전체 페이지)
+    """PIPE BOM PDF 페이지를 이미지로 렌더링 (전체 페이지, 페이지별 프로세스 병렬)
 
     dpi: 0이면 페이지 수에 따라 자동 결정 (<=10: 200, <=30: 150, >30: 120)
     max_pages: 0이면 전체 페이지 렌더링
+    렌더 결과는 RENDER_CACHE_DIR 에 (PDF 해시, 페이지, DPI) 로 캐시 → 같은 PDF 재업로드 시 래스터화 생략
+    (캐시는 RENDER_CACHE_MAX_MB 로 제한, 초과 시 오래 안 쓴 PNG 부터 삭제)
     """
     doc = fitz.open(pdf_path)
-    total = len(doc)
-    results = []
+    try:
+        total = len(doc)
+
+        # 페이지 수에 따라 DPI 자동 조절
+        if dpi <= 0:
+            if total <= 10:
+                dpi = 200
+            elif total <= 30:
+                dpi = 150
+            else:
+                dpi = 120
+
+        render_count = min(total, max_pages) if max_pages > 0 else total
+        digest = _pdf_digest(pdf_path)
+        cached = [str(RENDER_CACHE_DIR / f"{digest}_p{i+1}_{dpi}.png") for i in range(render_count)]
+        missing = [i for i in range(render_count) if not os.path.exists(cached[i])]
+        missing_set = set(missing)
+        logger.info(f"Rendering {len(missing)}/{render_count} BOM pages at {dpi} DPI from {pdf_path} "
+                    f"({render_count - len(missing)} cached)")
+
+        workers = render_worker_count(len(missing))
+        if workers == 1:
+            for i in missing:
+                _write_bom_page_png(doc[i], cached[i], dpi)
+    finally:
+        doc.close()
+
+    if workers > 1:
+        # 래스터화는 CPU 바운드 → 페이지별 프로세스 병렬
+        with new_process_pool(workers) as ex:
+            list(ex.map(_render_bom_page, repeat(pdf_path), missing,
+                        [cached[i] for i in missing], repeat(dpi)))
 
-    # 페이지 수에 따라 DPI 자동 조절
-    if dpi <= 0:
-        if total <= 10:
-            dpi = 200
-        elif total <= 30:
-            dpi = 150
-        else:
-            dpi = 120
-
-    render_count = min(total, max_pages) if max_pages > 0 else total
-    logger.info(f"Rendering {render_count} BOM pages at {dpi} DPI from {pdf_path}")
-
-    for i in range(render_count):
-        page = doc[i]
-        mat = fitz.Matrix(dpi / 72, dpi / 72)
-        pix = page.get_pixmap(matrix=mat)
+    results = []
+    for i, src in enumerate(cached):
         out_path = Path(output_dir) / f"bom_page{i+1}.png"
-        pix.save(str(out_path))
-        pix = None  # 메모리 해제
+        try:
+            if i not in missing_set:
+                os.utime(src)  # 캐시 적중 → mtime 갱신 (LRU 기준)
+            _link_or_copy(src, out_path)
+        except FileNotFoundError:
+            # 존재 확인 직후 다른 세션의 캐시 정리로 삭제됨 → 다시 렌더링
+            _render_bom_page(pdf_path, i, src, dpi)
+            _link_or_copy(src, out_path)
         results.append(str(out_path))
 
-        if (i + 1) % 10 == 0:
-            logger.info(f"  Rendered page {i+1}/{render_count}")
+    _evict_render_cache(set(cached))
 
-    doc.close()
     logger.info(f"Rendered {len(results)} BOM pages")
     return results
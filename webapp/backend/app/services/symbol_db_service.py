@@ -4,15 +4,17 @@ P&ID PDF의 첫 번째 페이지(LEGEND SYMBOL & ABBREVIATION)에서
 Claude Vision API를 사용하여 PIPING SYMBOLS, VALVE SYMBOLS 등을
 정확하게 추출하고 개별 심볼 이미지를 크롭하여 DB에 저장.
 """
-import anthropic
 import base64
 import fitz  # PyMuPDF
 import json
 import logging
 import re
+from collections import defaultdict
+from functools import lru_cache
 from pathlib import Path
 
 from app.core.config import ANTHROPIC_API_KEY
+from app.core.llm_client import get_anthropic_client
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +47,12 @@ GARBAGE_PATTERNS = [
     r"^SAFETY\s+DEVICE",
     r"^OTHER\s+SYMBOLS?",
 ]
+# 가비지 패턴 전체를 하나의 정규식으로 합침 (심볼당 match 1회)
+GARBAGE_REGEX = re.compile("|".join(f"(?:{p})" for p in GARBAGE_PATTERNS), re.IGNORECASE)
+
+# VLM 전송 이미지 - Claude Vision 은 긴 변 1568px 초과 시 내부 축소하므로 그 크기로 렌더해 JPEG 전송
+LEGEND_VLM_MAX_PX = 1568
+VLM_JPEG_QUALITY = 85
 
 # ─────────────────────────────────────────
 # VLM 프롬프트
@@ -110,6 +118,13 @@ Return ONLY a valid JSON array (no markdown fences, no commentary):
   {"category": "VALVE", "symbol_name": "", "description": "BALL VALVE (OPEN)", "bbox_pct": [0.23, 0.06, 0.30, 0.08]},
   ...
 ]"""
+# 레전드 지시문은 PDF 와 무관하게 동일 → system 블록에 cache_control 을 붙여 반복 호출 시 prompt cache 적중
+LEGEND_SYSTEM = [{
+    "type": "text",
+    "text": LEGEND_ANALYSIS_PROMPT,
+    "cache_control": {"type": "ephemeral"},
+}]
+LEGEND_USER_PROMPT = "Analyze the legend page shown in the image."
 
 
 # ─────────────────────────────────────────
@@ -123,14 +138,12 @@ def extract_symbols_from_legend(pdf_path: str, output_dir: str) -> list[dict]:
     """
     out = Path(output_dir)
     out.mkdir(parents=True, exist_ok=True)
-    symbols_dir = out / "symbols"
-    symbols_dir.mkdir(exist_ok=True)
+    symbols_dir = out / "symbols"  # 첫 크롭 저장 직전에 생성
 
     try:
-        # Phase 1: 렌더링
-        vlm_path, hires_path, page_w, page_h, scale = _render_legend_page(
-            pdf_path, str(out))
-        logger.info(f"Legend page rendered: {page_w:.0f}x{page_h:.0f}pt, scale={scale:.1f}")
+        # Phase 1: 렌더링 (VLM용만, 고해상도는 크롭 직전에)
+        vlm_path, page_w, page_h = _render_legend_page(pdf_path, str(out))
+        logger.info(f"Legend page rendered: {page_w:.0f}x{page_h:.0f}pt")
 
         # Phase 2: VLM 분석
         symbols = _analyze_legend_with_vlm(vlm_path)
@@ -141,6 +154,7 @@ def extract_symbols_from_legend(pdf_path: str, output_dir: str) -> list[dict]:
         logger.info(f"After cleanup: {len(symbols)} symbols")
 
         # Phase 4: 이미지 크롭 (text-position based)
+        hires_path, _ = _render_legend_hires(pdf_path, str(out))
         symbols = _crop_symbol_images(symbols, hires_path, str(symbols_dir), pdf_path)
         cropped = sum(1 for s in symbols if s.get("image_filename"))
         logger.info(f"Symbol images cropped: {cropped}/{len(symbols)}")
@@ -170,16 +184,43 @@ def extract_symbols_from_legend(pdf_path: str, output_dir: str) -> list[dict]:
 # Phase 1: 렌더링
 # ─────────────────────────────────────────
 def _render_legend_page(pdf_path: str, output_dir: str):
-    """레전드 페이지(page 0)를 렌더링.
+    """레전드 페이지(page 0)를 VLM 분석용 해상도로 렌더링.
 
     Returns:
-        (vlm_image_path, hires_image_path, page_width_pt, page_height_pt, hires_scale)
+        (vlm_image_path, page_width_pt, page_height_pt)
     """
     doc = fitz.open(pdf_path)
     page = doc[0]
     pw, ph = page.rect.width, page.rect.height
 
-    # 고해상도 (300 DPI) - 심볼 크롭용
+    # VLM용 (긴 변 최대 LEGEND_VLM_MAX_PX, JPEG)
+    max_dim = max(pw, ph)
+    vlm_dpi = min(200, int(LEGEND_VLM_MAX_PX / max_dim * 72))
+    vlm_mat = fitz.Matrix(vlm_dpi / 72, vlm_dpi / 72)
+    vlm_pix = page.get_pixmap(matrix=vlm_mat, alpha=False)
+    vlm_path = str(Path(output_dir) / "legend_page_vlm.jpg")
+    vlm_pix.save(vlm_path, jpg_quality=VLM_JPEG_QUALITY)
+
+    logger.info(f"Legend VLM render: {vlm_pix.width}x{vlm_pix.height}")
+
+    vlm_pix = None
+    doc.close()
+
+    return vlm_path, pw, ph
+
+
+def _render_legend_hires(pdf_path: str, output_dir: str):
+    """심볼 크롭용 고해상도(300 DPI) 전체 페이지 렌더링.
+
+    VLM 분석이 성공한 뒤에만 호출 → 폴백 경로에서는 300 DPI 전체 렌더링이 없음
+    (폴백은 심볼 영역만 clip 렌더링).
+
+    Returns:
+        (hires_image_path, hires_scale)
+    """
+    doc = fitz.open(pdf_path)
+    page = doc[0]
+
     hires_dpi = 300
     hires_scale = hires_dpi / 72
     hires_mat = fitz.Matrix(hires_scale, hires_scale)
@@ -187,22 +228,12 @@ def _render_legend_page(pdf_path: str, output_dir: str):
     hires_path = str(Path(output_dir) / "legend_page_full.png")
     hires_pix.save(hires_path)
 
-    # VLM용 (적정 해상도, 최대 5000px)
-    max_dim = max(pw, ph)
-    vlm_dpi = min(200, int(5000 / max_dim * 72))
-    vlm_mat = fitz.Matrix(vlm_dpi / 72, vlm_dpi / 72)
-    vlm_pix = page.get_pixmap(matrix=vlm_mat)
-    vlm_path = str(Path(output_dir) / "legend_page_vlm.png")
-    vlm_pix.save(vlm_path)
-
-    logger.info(f"Legend renders: hires={hires_pix.width}x{hires_pix.height}, "
-                f"vlm={vlm_pix.width}x{vlm_pix.height}")
+    logger.info(f"Legend hires render: {hires_pix.width}x{hires_pix.height}")
 
     hires_pix = None
-    vlm_pix = None
     doc.close()
 
-    return vlm_path, hires_path, pw, ph, hires_scale
+    return hires_path, hires_scale
 
 
 # ─────────────────────────────────────────
@@ -213,7 +244,7 @@ def _analyze_legend_with_vlm(vlm_image_path: str) -> list[dict]:
     if not ANTHROPIC_API_KEY:
         raise ValueError("ANTHROPIC_API_KEY not configured")
 
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    client = get_anthropic_client()
 
     with open(vlm_image_path, "rb") as f:
         img_data = base64.standard_b64encode(f.read()).decode("utf-8")
@@ -223,16 +254,17 @@ def _analyze_legend_with_vlm(vlm_image_path: str) -> list[dict]:
             "type": "image",
             "source": {
                 "type": "base64",
-                "media_type": "image/png",
+                "media_type": "image/jpeg",
                 "data": img_data,
             },
         },
-        {"type": "text", "text": LEGEND_ANALYSIS_PROMPT},
+        {"type": "text", "text": LEGEND_USER_PROMPT},
     ]
 
     resp = client.messages.create(
         model="claude-sonnet-4-5-20250929",
         max_tokens=16384,
+        system=LEGEND_SYSTEM,
         messages=[{"role": "user", "content": content}],
     )
 
@@ -290,12 +322,7 @@ def _validate_and_clean(symbols: list[dict]) -> list[dict]:
             continue
 
         # 가비지 패턴 필터링
-        skip = False
-        for pattern in GARBAGE_PATTERNS:
-            if re.match(pattern, desc, re.IGNORECASE):
-                skip = True
-                break
-        if skip:
+        if GARBAGE_REGEX.match(desc):
             continue
 
         # 카테고리 정규화
@@ -657,8 +684,9 @@ def _trim_grid_borders(img):
     if h < 10 or w < 20:
         return img
 
-    gray = img.convert('L')
-    pixels = gray.load()
+    import numpy as np
+
+    gray_arr = np.asarray(img.convert('L'))  # (h, w) uint8
 
     # Two-pass detection with different thresholds
     dark_threshold_strict = 180   # Catch lighter grid lines too
@@ -668,23 +696,26 @@ def _trim_grid_borders(img):
     max_check_x = min(40, w // 3)
     max_check_y = min(30, h // 3)
 
+    def _last_hit(indices, dark_counts, total, ratio):
+        """스캔 순서상 마지막으로 비율을 넘은 인덱스 (없으면 -1)."""
+        hits = np.flatnonzero(dark_counts / total > ratio)
+        return int(indices[hits[-1]]) if hits.size else -1
+
     def _detect_vline(x_range, threshold, ratio):
         """Find rightmost/leftmost grid line in given x range."""
-        best = -1
-        for x in x_range:
-            dark_count = sum(1 for y in range(h) if pixels[x, y] < threshold)
-            if dark_count / h > ratio:
-                best = x
-        return best
+        xs = np.asarray(x_range, dtype=np.intp)
+        if not xs.size:
+            return -1
+        dark_counts = (gray_arr[:, xs] < threshold).sum(axis=0)
+        return _last_hit(xs, dark_counts, h, ratio)
 
     def _detect_hline(y_range, threshold, ratio):
         """Find bottommost/topmost grid line in given y range."""
-        best = -1
-        for y in y_range:
-            dark_count = sum(1 for x in range(w) if pixels[x, y] < threshold)
-            if dark_count / w > ratio:
-                best = y
-        return best
+        ys = np.asarray(y_range, dtype=np.intp)
+        if not ys.size:
+            return -1
+        dark_counts = (gray_arr[ys, :] < threshold).sum(axis=1)
+        return _last_hit(ys, dark_counts, w, ratio)
 
     # ── LEFT edge: detect vertical grid line ──
     left = 0
@@ -966,26 +997,45 @@ SECTION_HEADERS_TEXT = {
     "OTHER SYMBOLS": "OTHER",
     "INSTRUMENT VALVE BODIES": "ACTUATED_VALVE",
 }
+# 설명 행에서 제외할 열 헤더 텍스트
+DESC_SKIP_TEXTS = frozenset({"SYMBOL", "DESCRIPTION", "SYMBOLS"})
+# 도면 테두리 그리드 라벨 (A-K, 1-16)
+GRID_LABEL_PATTERN = re.compile(r"^(?:[A-K]|1[0-6]|[1-9])$")
+
+
+@lru_cache(maxsize=None)
+def _is_bold_font(font_name: str) -> bool:
+    """폰트명 기반 볼드 여부 (페이지 내 폰트 종류는 몇 개뿐이라 캐시)"""
+    return "Bold" in font_name or "bold" in font_name
 
 
 def _extract_text_fallback(pdf_path: str, output_dir: str) -> list[dict]:
     """VLM 실패 시 텍스트 기반 폴백 추출 (정리 필터 포함)."""
+    import numpy as np
+
     doc = fitz.open(pdf_path)
     page = doc[0]
     page_width = page.rect.width
     page_height = page.rect.height
 
-    symbols_dir = Path(output_dir) / "symbols"
-    symbols_dir.mkdir(parents=True, exist_ok=True)
+    # 텍스트 페이지 1회 생성 → 헤더 사전 검사와 dict 추출에 공유
+    textpage = page.get_textpage(flags=fitz.TEXT_PRESERVE_WHITESPACE)
+
+    # 섹션 헤더가 하나도 없으면 레전드 페이지가 아님 → 무거운 처리 없이 종료
+    raw_upper = page.get_text("text", textpage=textpage).upper()
+    if not any(key in raw_upper for key in SECTION_HEADERS_TEXT):
+        doc.close()
+        return []
+
+    symbols_dir = Path(output_dir) / "symbols"  # 첫 크롭 저장 직전에 생성
 
-    # 고해상도 렌더링
+    # 고해상도 배율 (페이지 전체가 아니라 심볼 영역만 clip 렌더링)
     hires_dpi = 300
     scale = hires_dpi / 72
     hires_mat = fitz.Matrix(scale, scale)
-    hires_pix = page.get_pixmap(matrix=hires_mat)
 
     # 텍스트 블록 추출
-    blocks = page.get_text("dict", flags=fitz.TEXT_PRESERVE_WHITESPACE)["blocks"]
+    blocks = page.get_text("dict", textpage=textpage)["blocks"]
     text_lines = []
     for block in blocks:
         if block["type"] != 0:
@@ -1000,15 +1050,16 @@ def _extract_text_fallback(pdf_path: str, output_dir: str) -> list[dict]:
                     "x0": bbox[0], "y0": bbox[1],
                     "x1": bbox[2], "y1": bbox[3],
                     "text": text,
+                    "text_upper": text.upper(),
                     "font_size": span["size"],
                     "font_name": span["font"],
-                    "is_bold": "Bold" in span["font"] or "bold" in span["font"],
+                    "is_bold": _is_bold_font(span["font"]),
                 })
 
     # 섹션 헤더 식별
     sections = []
     for tl in text_lines:
-        text_upper = tl["text"].upper().strip()
+        text_upper = tl["text_upper"]
         for header_key, category in SECTION_HEADERS_TEXT.items():
             if header_key in text_upper:
                 sections.append({
@@ -1020,48 +1071,49 @@ def _extract_text_fallback(pdf_path: str, output_dir: str) -> list[dict]:
 
     sections.sort(key=lambda s: (s["x0"], s["y0"]))
 
+    # 텍스트 좌표를 배열로 한 번 변환 → 섹션별 필터는 불리언 마스크 1회 (float64 로 비교 결과 동일)
+    # 글자 크기/헤더 조건은 섹션과 무관하므로 미리 계산
+    tl_x0 = np.fromiter((tl["x0"] for tl in text_lines), dtype=np.float64, count=len(text_lines))
+    tl_y0 = np.fromiter((tl["y0"] for tl in text_lines), dtype=np.float64, count=len(text_lines))
+    is_desc = np.fromiter(
+        (tl["font_size"] < 6.5 and tl["text_upper"] not in DESC_SKIP_TEXTS for tl in text_lines),
+        dtype=bool, count=len(text_lines))
+
     symbols = []
     for sec_idx, section in enumerate(sections):
         category = section["category"]
         x_left = section["x0"] - 60
         x_right = section["x1"] + 40
 
+        # 오른쪽 이웃 섹션(x 정렬상 첫 번째)과 같은 열의 아래 섹션을 한 번의 순회로 탐색
+        sec_x0, sec_x1, sec_y1 = section["x0"], section["x1"], section["y1"]
         next_sec_x = page_width
-        for other in sections:
-            if other["x0"] > section["x1"] + 50:
-                next_sec_x = min(next_sec_x, other["x0"] - 10)
-                break
-        x_right = min(x_right, next_sec_x)
-
-        y_start = section["y1"] + 5
+        found_next = False
+        y_start = sec_y1 + 5
         y_end = page_height - 50
         for other in sections:
-            if (other["y0"] > section["y1"] + 20 and
-                    abs(other["x0"] - section["x0"]) < 80):
+            other_x0 = other["x0"]
+            if not found_next and other_x0 > sec_x1 + 50:
+                next_sec_x = min(next_sec_x, other_x0 - 10)
+                found_next = True
+            if other["y0"] > sec_y1 + 20 and abs(other_x0 - sec_x0) < 80:
                 y_end = min(y_end, other["y0"] - 5)
+        x_right = min(x_right, next_sec_x)
 
-        desc_lines = [
-            tl for tl in text_lines
-            if (x_left - 20 <= tl["x0"] <= x_right + 60 and
-                y_start <= tl["y0"] <= y_end and
-                tl["font_size"] < 6.5 and
-                tl["text"].upper() not in ("SYMBOL", "DESCRIPTION", "SYMBOLS"))
-        ]
-        desc_lines.sort(key=lambda t: (round(t["y0"] / 3) * 3, t["x0"]))
-
-        rows = []
-        current_row = []
-        prev_y = -100
-        for tl in desc_lines:
-            if abs(tl["y0"] - prev_y) > 4:
-                if current_row:
-                    rows.append(current_row)
-                current_row = [tl]
-            else:
-                current_row.append(tl)
-            prev_y = tl["y0"]
-        if current_row:
-            rows.append(current_row)
+        # 심볼 크롭 좌측 경계/파일명 태그는 섹션 내 모든 행에 공통
+        sym_x0 = max(0, x_left - 10)
+        px0 = int(sym_x0 * scale)
+        cat_tag = category.lower()
+
+        mask = (is_desc &
+                (tl_x0 >= x_left - 20) & (tl_x0 <= x_right + 60) &
+                (tl_y0 >= y_start) & (tl_y0 <= y_end))
+        # 행 그룹화: (3pt 단위 y, x) 안정 정렬 후 인접 y 차이가 4pt 를 넘는 지점에서 분할
+        idx = np.flatnonzero(mask)  # 원래 텍스트 순서 (동순위 안정 정렬 기준)
+        order = idx[np.lexsort((tl_x0[idx], np.round(tl_y0[idx] / 3) * 3))]
+        breaks = np.flatnonzero(np.abs(np.diff(tl_y0[order])) > 4) + 1
+        rows = ([[text_lines[i] for i in grp] for grp in np.split(order, breaks)]
+                if order.size else [])
 
         for row in rows:
             if not row:
@@ -1070,7 +1122,7 @@ def _extract_text_fallback(pdf_path: str, output_dir: str) -> list[dict]:
             full_text = " ".join(t["text"] for t in row).strip()
             if len(full_text) < 3:
                 continue
-            if re.match(r"^[A-K]$", full_text) or re.match(r"^1[0-6]$|^[1-9]$", full_text):
+            if GRID_LABEL_PATTERN.match(full_text):
                 continue
 
             symbol_name = ""
@@ -1083,23 +1135,23 @@ def _extract_text_fallback(pdf_path: str, output_dir: str) -> list[dict]:
             row_y_max = max(t["y1"] for t in row) + 3
             row_x_min = min(t["x0"] for t in row)
 
-            sym_x0 = max(0, x_left - 10)
             sym_y0 = max(0, row_y_min - 2)
             sym_x1 = min(page_width, row_x_min - 2)
             sym_y1 = min(page_height, row_y_max + 2)
 
-            px0, py0 = int(sym_x0 * scale), int(sym_y0 * scale)
+            py0 = int(sym_y0 * scale)
             px1, py1 = int(sym_x1 * scale), int(sym_y1 * scale)
 
             img_filename = None
             img_path = None
             if px1 - px0 > 10 and py1 - py0 > 5:
                 sid = len(symbols) + 1
-                img_filename = f"symbol_{sid:03d}_{category.lower()}.png"
+                img_filename = f"symbol_{sid:03d}_{cat_tag}.png"
                 img_full_path = symbols_dir / img_filename
                 try:
-                    crop_rect = fitz.IRect(px0, py0, px1, py1)
-                    crop_pix = fitz.Pixmap(hires_pix, crop_rect)
+                    symbols_dir.mkdir(parents=True, exist_ok=True)
+                    clip = fitz.Rect(sym_x0, sym_y0, sym_x1, sym_y1)
+                    crop_pix = page.get_pixmap(matrix=hires_mat, clip=clip, alpha=False)
                     crop_pix.save(str(img_full_path))
                     crop_pix = None
                     img_path = str(img_full_path)
@@ -1118,8 +1170,8 @@ def _extract_text_fallback(pdf_path: str, output_dir: str) -> list[dict]:
                 ],
             })
 
-    hires_pix = None
     doc.close()
+    fitz.TOOLS.store_shrink(100)  # MuPDF 내부 캐시 해제
 
     # 정리 필터 적용
     symbols = _validate_and_clean(symbols)
@@ -1131,22 +1183,16 @@ def _extract_text_fallback(pdf_path: str, output_dir: str) -> list[dict]:
 # ─────────────────────────────────────────
 def get_symbol_reference_text(symbols: list[dict]) -> str:
     """심볼 데이터를 VLM 프롬프트용 참조 텍스트로 변환."""
-    ref_parts = []
-    by_category = {}
+    by_category = defaultdict(list)
     for sym in symbols:
-        cat = sym["category"]
-        if cat not in by_category:
-            by_category[cat] = []
-        by_category[cat].append(sym)
-
-    for category, syms in by_category.items():
-        ref_parts.append(f"\n### {category}")
-        for s in syms:
-            name = s.get("symbol_name", "")
-            desc = s.get("description", "")
-            if name:
-                ref_parts.append(f"  - {name}: {desc}")
-            else:
-                ref_parts.append(f"  - {desc}")
+        by_category[sym["category"]].append(sym)
+
+    def _lines():
+        for category, syms in by_category.items():
+            yield f"\n### {category}"
+            for s in syms:
+                name = s.get("symbol_name", "")
+                desc = s.get("description", "")
+                yield f"  - {name}: {desc}" if name else f"  - {desc}"
 
-    return "\n".join(ref_parts)
+    return "\n".join(_lines())
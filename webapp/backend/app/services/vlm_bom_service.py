@@ -6,7 +6,6 @@ Claude Vision을 사용하여 파이핑 아이소메트릭 도면에서
 Burckhardt Compression / Kuraray Singapore 형식 특화.
 """
 import fitz
-import anthropic
 import base64
 import json
 import logging
@@ -14,12 +13,17 @@ import re
 import time
 from pathlib import Path
 from app.core.config import ANTHROPIC_API_KEY
+from app.core.llm_client import get_anthropic_client
 
 logger = logging.getLogger(__name__)
 
 # BOM 테이블 크롭 영역 (페이지 우측)
 TABLE_CROP_X_RATIO = 0.70  # 페이지 폭의 70%~100% 영역이 BOM 테이블
 
+# VLM 전송 이미지 포맷 (PNG 디스크 저장 대신 메모리 JPEG)
+VLM_JPEG_QUALITY = 85
+VLM_MEDIA_TYPE = "image/jpeg"
+
 # ──────────────────────────────────────────────
 # VLM 프롬프트 (도면 분석)
 # ──────────────────────────────────────────────
@@ -222,22 +226,21 @@ RULES:
 3. Return ONLY valid JSON"""
 
 
-def _encode_image(image_path: str) -> str:
-    """이미지를 base64로 인코딩"""
-    with open(image_path, "rb") as f:
-        return base64.standard_b64encode(f.read()).decode("utf-8")
+def _encode_image(img_bytes: bytes) -> str:
+    """이미지 바이트를 base64로 인코딩"""
+    return base64.standard_b64encode(img_bytes).decode("utf-8")
 
 
-def _call_vlm(images: list[tuple[str, str]], prompt: str, max_tokens: int = 4096) -> str:
+def _call_vlm(images: list[tuple[bytes, str]], prompt: str, max_tokens: int = 4096) -> str:
     """Claude VLM API 호출"""
     if not ANTHROPIC_API_KEY:
         raise ValueError("ANTHROPIC_API_KEY not configured")
 
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    client = get_anthropic_client()
 
     content = []
-    for img_path, media_type in images:
-        img_data = _encode_image(img_path)
+    for img_bytes, media_type in images:
+        img_data = _encode_image(img_bytes)
         content.append({
             "type": "image",
             "source": {
@@ -370,8 +373,8 @@ def _postprocess_cut_lengths(cuts: list, bom_items: list[dict]) -> list[dict]:
     return cleaned_cuts, remaining_bom
 
 
-def render_page_for_vlm(doc, page_num: int, output_dir: str, max_px: int = 7500) -> tuple[str, str]:
-    """VLM 분석용 페이지 렌더링 (전체 + 테이블 크롭)"""
+def render_page_for_vlm(doc, page_num: int, max_px: int = 7500) -> tuple[bytes, bytes | None]:
+    """VLM 분석용 페이지 렌더링 (전체 + 테이블 크롭, 메모리 JPEG 바이트)"""
     page = doc[page_num]
     page_width = page.rect.width
     page_height = page.rect.height
@@ -382,14 +385,12 @@ def render_page_for_vlm(doc, page_num: int, output_dir: str, max_px: int = 7500)
     dpi = max(dpi, 120)
 
     mat = fitz.Matrix(dpi / 72, dpi / 72)
-    pix = page.get_pixmap(matrix=mat)
+    pix = page.get_pixmap(matrix=mat, alpha=False)
 
-    full_path = str(Path(output_dir) / f"vlm_page_{page_num + 1:03d}.png")
-    pix.save(full_path)
+    full_img = pix.tobytes("jpeg", jpg_quality=VLM_JPEG_QUALITY)
     logger.debug(f"Page {page_num+1}: {pix.width}x{pix.height}px at {dpi}dpi")
 
     # BOM 테이블 영역 크롭 (우측 30%)
-    table_path = str(Path(output_dir) / f"vlm_table_{page_num + 1:03d}.png")
     try:
         table_x0 = page_width * TABLE_CROP_X_RATIO
         clip_rect = fitz.Rect(table_x0, 0, page_width, page_height)
@@ -398,19 +399,19 @@ def render_page_for_vlm(doc, page_num: int, output_dir: str, max_px: int = 7500)
         table_dpi = min(300, int(max_px / max(crop_w, crop_h) * 72))
         table_dpi = max(table_dpi, 150)
         table_mat = fitz.Matrix(table_dpi / 72, table_dpi / 72)
-        table_pix = page.get_pixmap(matrix=table_mat, clip=clip_rect)
-        table_pix.save(table_path)
+        table_pix = page.get_pixmap(matrix=table_mat, clip=clip_rect, alpha=False)
+        table_img = table_pix.tobytes("jpeg", jpg_quality=VLM_JPEG_QUALITY)
         logger.debug(f"Table crop page {page_num+1}: {table_pix.width}x{table_pix.height}px at {table_dpi}dpi")
         table_pix = None
     except Exception as e:
         logger.warning(f"Table crop failed for page {page_num + 1}: {e}")
-        table_path = None
+        table_img = None
 
     pix = None
-    return full_path, table_path
+    return full_img, table_img
 
 
-def analyze_single_page(full_img: str, table_img: str | None,
+def analyze_single_page(full_img: bytes, table_img: bytes | None,
                         page_num: int, symbol_ref: str = "") -> dict:
     """단일 BOM 페이지 VLM 분석 (2-pass)"""
     result = {"page": page_num, "vlm_source": "claude-sonnet-4-5"}
@@ -421,7 +422,7 @@ def analyze_single_page(full_img: str, table_img: str | None,
         prompt += f"\n\nREFERENCE SYMBOLS from P&ID Legend:\n{symbol_ref}"
 
     try:
-        resp_text = _call_vlm([(full_img, "image/png")], prompt, max_tokens=4096)
+        resp_text = _call_vlm([(full_img, VLM_MEDIA_TYPE)], prompt, max_tokens=4096)
         drawing_data = _parse_json_response(resp_text)
         if drawing_data:
             result.update(drawing_data)
@@ -435,7 +436,7 @@ def analyze_single_page(full_img: str, table_img: str | None,
         result["drawing_error"] = str(e)
 
     # Pass 2: BOM 테이블 정밀 분석 (크롭 이미지, 더 높은 해상도)
-    if table_img and Path(table_img).exists():
+    if table_img:
         # 페이지 1은 다른 포맷
         if page_num == 1:
             table_prompt = TABLE_ANALYSIS_PROMPT_PAGE1
@@ -443,7 +444,7 @@ def analyze_single_page(full_img: str, table_img: str | None,
             table_prompt = TABLE_ANALYSIS_PROMPT.format(page_num=page_num)
 
         try:
-            table_resp = _call_vlm([(table_img, "image/png")], table_prompt, max_tokens=8000)
+            table_resp = _call_vlm([(table_img, VLM_MEDIA_TYPE)], table_prompt, max_tokens=8000)
             table_data = _parse_json_response(table_resp)
             if table_data:
                 # BOM 아이템 후처리
@@ -533,9 +534,6 @@ def process_bom_with_vlm(pdf_path: str, output_dir: str,
     total_pages = len(doc)
     results = []
 
-    vlm_dir = Path(output_dir) / "vlm_analysis"
-    vlm_dir.mkdir(parents=True, exist_ok=True)
-
     logger.info(f"Starting VLM analysis of {total_pages} BOM pages")
     start_time = time.time()
 
@@ -544,7 +542,7 @@ def process_bom_with_vlm(pdf_path: str, output_dir: str,
         page_start = time.time()
 
         # 1. VLM용 이미지 렌더링
-        full_img, table_img = render_page_for_vlm(doc, page_idx, str(vlm_dir))
+        full_img, table_img = render_page_for_vlm(doc, page_idx)
 
         # 2. VLM 분석
         try: